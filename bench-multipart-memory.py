@@ -0,0 +1,192 @@
+"""
+マルチパートアップロードのメモリ使用量を比較するベンチマーク。
+
+ローカルのHTTPサーバーをNotionの /file_uploads/{id}/send の代わりに立て、
+同じファイルを次の2つの方式でパートごとに並行送信し、ピークメモリを比較します。
+
+    legacy    : f.read(10MB) したbytesを requests の files= に渡す（従来の実装）
+    streaming : sample-notion-get-db.py の MultipartFileBody で mmap から直接送信する
+
+各方式は別プロセスで実行し、tracemallocのピーク（Pythonが確保したメモリ）と
+ru_maxrssの増分（プロセスのピークRSS）を計測します。
+サーバー側では受信したパートの内容が元のファイルと一致するかも検証します。
+
+使い方:
+    python bench-multipart-memory.py --size-mb 200 --parallelism 4
+"""
+import argparse
+import email.parser
+import hashlib
+import importlib.util
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+MODES = ["legacy", "streaming"]
+
+
+# sample-notion-get-db.py をモジュールとして読み込む関数（ファイル名にハイフンを含むため）
+def load_script_module():
+    path = os.path.join(SCRIPT_DIR, "sample-notion-get-db.py")
+    spec = importlib.util.spec_from_file_location("sample_notion_get_db", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+# ru_maxrss をバイト単位で返す関数（LinuxはKB、macOSはバイト）
+def max_rss_bytes() -> int:
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss if sys.platform == "darwin" else rss * 1024
+
+
+# ======== Server ==============================================================
+# 受信したmultipartを検証して捨てるHTTPサーバーを起動する関数
+def start_server(filepath: str, chunk_size: int) -> tuple[ThreadingHTTPServer, dict]:
+    with open(filepath, "rb") as f:
+        expected = {}
+        part_number = 1
+        while chunk := f.read(chunk_size):
+            expected[part_number] = hashlib.sha256(chunk).hexdigest()
+            part_number += 1
+    result = {"ok": 0, "mismatch": []}
+    lock = threading.Lock()
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            length = int(self.headers["Content-Length"])
+            raw = self.rfile.read(length)
+            message = email.parser.BytesParser().parsebytes(
+                f"Content-Type: {self.headers['Content-Type']}\r\n\r\n".encode() + raw
+            )
+            fields = {part.get_param("name", header="content-disposition"): part.get_payload(decode=True)
+                      for part in message.get_payload()}
+            part_number = int(fields["part_number"])
+            with lock:
+                if hashlib.sha256(fields["file"]).hexdigest() == expected[part_number]:
+                    result["ok"] += 1
+                else:
+                    result["mismatch"].append(part_number)
+
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", "2")
+            self.end_headers()
+            self.wfile.write(b"{}")
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, result
+
+
+# ======== Client ==============================================================
+# 従来の実装と同じく、パートをbytesとして読み込んでfiles=で送信する
+def send_part_legacy(module, url: str, filepath: str, part_number: int) -> None:
+    import requests
+    with open(filepath, "rb") as f:
+        f.seek((part_number - 1) * module.MULTIPART_CHUNK_SIZE)
+        chunk = f.read(module.MULTIPART_CHUNK_SIZE)
+    files = {
+        "file": ("bench.bin", chunk, "application/octet-stream"),
+        "part_number": (None, str(part_number))
+    }
+    response = requests.post(url, files=files)
+    response.raise_for_status()
+
+
+# MultipartFileBodyでmmapから直接送信する
+def send_part_streaming(module, url: str, filepath: str, part_number: int) -> None:
+    import requests
+    offset = (part_number - 1) * module.MULTIPART_CHUNK_SIZE
+    length = min(module.MULTIPART_CHUNK_SIZE, os.path.getsize(filepath) - offset)
+    with module.MultipartFileBody(filepath, offset, length, "bench.bin", "application/octet-stream",
+                                  fields={"part_number": part_number}) as body:
+        response = requests.post(url, headers={"Content-Type": body.content_type}, data=body)
+        response.raise_for_status()
+
+
+# 子プロセスで1つの方式を計測し、結果をJSONで標準出力に書く
+def run_child(mode: str, url: str, filepath: str, parallelism: int) -> None:
+    module = load_script_module()
+    send_part = send_part_legacy if mode == "legacy" else send_part_streaming
+    number_of_parts = (os.path.getsize(filepath) + module.MULTIPART_CHUNK_SIZE - 1) // module.MULTIPART_CHUNK_SIZE
+
+    rss_before = max_rss_bytes()
+    tracemalloc.start()
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=parallelism) as executor:
+        list(executor.map(lambda n: send_part(module, url, filepath, n), range(1, number_of_parts + 1)))
+    elapsed = time.perf_counter() - started
+    _, traced_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    print(json.dumps({
+        "mode": mode,
+        "parts": number_of_parts,
+        "seconds": elapsed,
+        "traced_peak_bytes": traced_peak,
+        "rss_growth_bytes": max_rss_bytes() - rss_before,
+    }))
+
+
+# ======== Main ================================================================
+def main() -> None:
+    parser = argparse.ArgumentParser(description="マルチパートアップロードのメモリ使用量を比較します。")
+    parser.add_argument("--size-mb", type=int, default=200, help="テスト用ファイルのサイズ（MB）")
+    parser.add_argument("--parallelism", type=int, default=4, help="同時に送信するパート数")
+    parser.add_argument("--child", choices=MODES, help=argparse.SUPPRESS)
+    parser.add_argument("--url", help=argparse.SUPPRESS)
+    parser.add_argument("--file", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(args.child, args.url, args.file, args.parallelism)
+        return
+
+    module = load_script_module()
+    with tempfile.TemporaryDirectory() as tmpdir:
+        filepath = os.path.join(tmpdir, "bench.bin")
+        with open(filepath, "wb") as f:
+            for _ in range(args.size_mb):
+                f.write(os.urandom(1024 * 1024))
+
+        server, verified = start_server(filepath, module.MULTIPART_CHUNK_SIZE)
+        url = f"http://127.0.0.1:{server.server_port}/v1/file_uploads/bench/send"
+
+        print(f"file: {args.size_mb}MB, parallelism: {args.parallelism}")
+        print(f"{'mode':<10} {'parts':>5} {'seconds':>8} {'traced peak MB':>15} {'RSS growth MB':>14}")
+        results = []
+        for mode in MODES:
+            output = subprocess.run(
+                [sys.executable, __file__, "--child", mode, "--url", url, "--file", filepath,
+                 "--parallelism", str(args.parallelism)],
+                check=True, capture_output=True, text=True
+            ).stdout
+            result = json.loads(output.strip().splitlines()[-1])
+            results.append(result)
+            print(f"{mode:<10} {result['parts']:>5} {result['seconds']:>8.2f} "
+                  f"{result['traced_peak_bytes'] / 1024 / 1024:>15.1f} "
+                  f"{result['rss_growth_bytes'] / 1024 / 1024:>14.1f}")
+        server.shutdown()
+
+    expected_parts = sum(result["parts"] for result in results)
+    if verified["mismatch"] or verified["ok"] != expected_parts:
+        print(f"❌ 受信したパートが元のファイルと一致しません: {verified}")
+        sys.exit(1)
+    print(f"✅ 受信した{verified['ok']}パートはすべて元のファイルと一致しました。")
+
+
+if __name__ == "__main__":
+    main()
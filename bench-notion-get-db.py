@@ -0,0 +1,596 @@
+"""
+sample-notion-get-db.py をオフラインで計測するベンチマーク。
+
+api.notion.com と動画サイトの代わりに、次の2つをローカルで動かして計測します。
+
+    FakeNotionServer : スクリプトが使うNotion APIのエンドポイント（データベースのクエリ（ページネーション）、
+                       ページの更新、ブロックの子の取得・削除・追加、file_uploadsの作成・送信・完了・取得）を
+                       メモリ上で再現するHTTPサーバー。応答の遅延と429（Retry-After付き）を注入できます。
+                       合成した動画・サムネイルのデータも配信します（Range対応）。
+    StubIE           : https://bench.invalid/<id>?size=<bytes> 形式のURLを受け付けるyt-dlpの抽出器。
+                       FakeNotionServer が配信する指定サイズの合成ファイルをダウンロードさせます。
+
+シナリオごとに子プロセスでスクリプトのパイプラインを実行し、アイテム/秒、アップロード速度（MB/s）、
+ピークメモリ（ru_maxrss）、Notion APIのリクエスト数などを表示します。
+サーバーは親プロセスで動かすため、子プロセスのメモリには含まれません。
+Pillowがあればサムネイルには本物のJPEGを配信し、変換に失敗した（警告が出た）場合はベンチマークを失敗させます。
+スクリプトはimportlibで読み込むため、サムネイルの変換はプロセスプールを使わずに子プロセス内で行われます。
+
+使い方:
+    python bench-notion-get-db.py                          # すべてのシナリオ
+    python bench-notion-get-db.py --scenario 100x50MB --workers 4
+    python bench-notion-get-db.py --scale 0.1 --latency 0.05 --throttle-rps 3
+    python bench-notion-get-db.py --items 20 --size-mb 30  # 任意の件数・サイズ
+    python bench-notion-get-db.py --scenario 500xsmall --workers 4 --databases 3
+"""
+import argparse
+import importlib.util
+import io
+import json
+import logging
+import os
+import random
+import re
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from dataclasses import asdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+from urllib.parse import parse_qs, urlparse
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+BENCH_DATABASE_ID = "bench-database"
+STUB_URL_PREFIX = "https://bench.invalid"
+
+# シナリオ名: (アイテム数, 動画1件あたりのバイト数)
+SCENARIOS = {
+    "1x2GB": (1, 2 * 1024 ** 3),
+    "100x50MB": (100, 50 * 1024 ** 2),
+    "500xsmall": (500, 200 * 1024),
+}
+THUMBNAIL_SIZE = 50 * 1024
+
+
+# sample-notion-get-db.py をモジュールとして読み込む関数（ファイル名にハイフンを含むため）
+def load_script_module():
+    path = os.path.join(SCRIPT_DIR, "sample-notion-get-db.py")
+    spec = importlib.util.spec_from_file_location("sample_notion_get_db", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+# サムネイルとして配信する画像を作る関数（Pillowがなければスクリプトもサムネイルを変換しないためNone）
+def make_thumbnail_bytes() -> Optional[bytes]:
+    try:
+        from PIL import Image
+    except ImportError:
+        return None
+    # 長辺がTHUMBNAIL_MAX_SIZE（既定は1280px）を超える本物のJPEGにして、縮小・変換の処理を計測する
+    buffer = io.BytesIO()
+    Image.effect_noise((1920, 1080), 32).convert("RGB").save(buffer, format="JPEG", quality=90)
+    return buffer.getvalue()
+
+
+# ru_maxrss をバイト単位で返す関数（LinuxはKB、macOSはバイト）
+def max_rss_bytes() -> int:
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss if sys.platform == "darwin" else rss * 1024
+
+
+# ======== Fake Notion API =====================================================
+# Notionと同じく分単位に丸めた、現在のlast_edited_timeを返す関数
+def notion_time() -> str:
+    return time.strftime("%Y-%m-%dT%H:%M:00.000Z", time.gmtime())
+
+
+# n番目のデータベースのIDを返す関数（0番目は BENCH_DATABASE_ID）
+def bench_database_id(index: int) -> str:
+    return BENCH_DATABASE_ID if index == 0 else f"{BENCH_DATABASE_ID}-{index}"
+
+
+# クエリのfilterのうち、このベンチマークで使う条件（チェックボックスとlast_edited_time）を評価する関数
+def matches_filter(page: dict, condition: Optional[dict]) -> bool:
+    if not condition:
+        return True
+    if "and" in condition:
+        return all(matches_filter(page, sub) for sub in condition["and"])
+    if "or" in condition:
+        return any(matches_filter(page, sub) for sub in condition["or"])
+    if condition.get("timestamp") == "last_edited_time":
+        since = condition["last_edited_time"].get("on_or_after")
+        return since is None or page["last_edited_time"] >= since
+    if "checkbox" in condition:
+        return page["properties"][condition["property"]]["checkbox"] == condition["checkbox"]["equals"]
+    return True
+
+
+class FakeNotionServer:
+    """
+    Notion APIの代わりに応答するローカルのHTTPサーバー。
+
+    引数:
+        items (int): データベースに作成する未処理アイテムの数。
+        video_size (int): 各アイテムの動画のバイト数。
+        blocks_per_page (int): 各ページにあらかじめ作成しておく子ブロックの数。
+        latency (float): Notion APIの各応答に加える遅延（秒）。
+        throttle_rps (float): これを超えるリクエストレートで429を返す（0の場合は返さない）。
+        throttle_probability (float): レートに関係なく429を返す確率。
+        retry_after (float): 429のRetry-Afterの秒数。
+        download_bytes_per_second (float): 動画の配信速度の上限（0の場合は上限なし）。
+        databases (int): アイテムを振り分けるデータベースの数（IDは bench_database_id(n)）。
+    """
+    def __init__(self, items: int, video_size: int, blocks_per_page: int = 5, latency: float = 0.0,
+                 throttle_rps: float = 0.0, throttle_probability: float = 0.0, retry_after: float = 1.0,
+                 download_bytes_per_second: float = 0.0, databases: int = 1):
+        self.latency = latency
+        self.throttle_rps = throttle_rps
+        self.throttle_probability = throttle_probability
+        self.retry_after = retry_after
+        self.download_bytes_per_second = download_bytes_per_second
+        self.lock = threading.Lock()
+        self.pages = {}
+        self.blocks = {}
+        self.file_uploads = {}
+        self.requests = {}
+        self.throttled = 0
+        self.bytes_received = 0
+        self._tokens = throttle_rps
+        self._updated_at = time.monotonic()
+        self.blocks_per_page = blocks_per_page
+        self.thumbnail = make_thumbnail_bytes()
+
+        for index in range(items):
+            self.add_item(video_size, bench_database_id(index % max(1, databases)))
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler_class())
+        self._server.daemon_threads = True
+        self.port = self._server.server_port
+        self.base_url = f"http://127.0.0.1:{self.port}"
+
+    def add_item(self, video_size: int, database_id: str = BENCH_DATABASE_ID) -> str:
+        """未処理のアイテムを1件追加し、そのページIDを返します（実行中にも追加できます）。"""
+        with self.lock:
+            index = len(self.pages)
+            page_id = str(uuid.UUID(int=index + 1))
+            self.pages[page_id] = {
+                "object": "page",
+                "id": page_id,
+                "parent": {"type": "database_id", "database_id": database_id},
+                "last_edited_time": notion_time(),
+                "properties": {
+                    "title": {"type": "title", "title": []},
+                    "URL": {"type": "url", "url": f"{STUB_URL_PREFIX}/video{index:05d}?size={video_size}"},
+                    "処理済": {"type": "checkbox", "checkbox": False},
+                },
+            }
+            self.blocks[page_id] = [{"object": "block", "id": f"{page_id}-{n}", "type": "paragraph"}
+                                    for n in range(self.blocks_per_page)]
+        return page_id
+
+    def _touch(self, page_id: str) -> None:
+        if page_id in self.pages:
+            self.pages[page_id]["last_edited_time"] = notion_time()
+
+    def start(self) -> None:
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _should_throttle(self) -> bool:
+        with self.lock:
+            if self.throttle_probability and random.random() < self.throttle_probability:
+                self.throttled += 1
+                return True
+            if not self.throttle_rps:
+                return False
+            now = time.monotonic()
+            self._tokens = min(self.throttle_rps, self._tokens + (now - self._updated_at) * self.throttle_rps)
+            self._updated_at = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return False
+            self.throttled += 1
+            return True
+
+    def summary(self) -> dict:
+        with self.lock:
+            return {
+                "requests": dict(sorted(self.requests.items())),
+                "throttled": self.throttled,
+                "bytes_received": self.bytes_received,
+                "processed_pages": sum(1 for page in self.pages.values()
+                                       if page["properties"]["処理済"]["checkbox"]),
+                "completed_uploads": sum(1 for upload in self.file_uploads.values()
+                                         if upload["status"] == "uploaded"),
+            }
+
+    def _handler_class(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                self._dispatch("GET")
+
+            def do_POST(self):
+                self._dispatch("POST")
+
+            def do_PATCH(self):
+                self._dispatch("PATCH")
+
+            def do_DELETE(self):
+                self._dispatch("DELETE")
+
+            def _reply(self, status: int, payload: dict, headers: dict = None) -> None:
+                body = json.dumps(payload).encode()
+                head = [f"HTTP/1.1 {status} {self.responses.get(status, ('',))[0]}",
+                        "Content-Type: application/json", f"Content-Length: {len(body)}"]
+                head += [f"{key}: {value}" for key, value in (headers or {}).items()]
+                # ヘッダーと本文を1回で書き込む（分けるとNagleと遅延ACKで応答が40ms遅れる）
+                self.wfile.write(("\r\n".join(head) + "\r\n\r\n").encode() + body)
+
+            def _error(self, status: int, message: str) -> None:
+                self._reply(status, {"object": "error", "status": status, "message": message})
+
+            def _dispatch(self, method: str) -> None:
+                url = urlparse(self.path)
+                if url.path.startswith("/media/"):
+                    return self._media(url)
+
+                raw = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+                parts = url.path.strip("/").split("/")[1:]
+                endpoint = f"{method} /" + "/".join("{id}" if re.search(r"\d", part) else part for part in parts)
+                with fake.lock:
+                    fake.requests[endpoint] = fake.requests.get(endpoint, 0) + 1
+                    fake.bytes_received += len(raw)
+                if fake.latency:
+                    time.sleep(fake.latency)
+                if fake._should_throttle():
+                    return self._reply(429, {"object": "error", "status": 429, "code": "rate_limited"},
+                                       {"Retry-After": str(fake.retry_after)})
+                try:
+                    self._route(method, parts, parse_qs(url.query), raw)
+                except KeyError as e:
+                    self._error(404, f"not found: {e}")
+
+            def _route(self, method: str, parts: list, query: dict, raw: bytes) -> None:
+                if method == "POST" and parts[0] == "databases" and parts[-1] == "query":
+                    return self._query(parts[1], json.loads(raw or b"{}"))
+                if method == "PATCH" and parts[0] == "pages":
+                    with fake.lock:
+                        page = fake.pages[parts[1]]
+                        page["properties"].update(json.loads(raw)["properties"])
+                        fake._touch(parts[1])
+                    return self._reply(200, page)
+                if parts[0] == "blocks" and parts[-1] == "children":
+                    if method == "GET":
+                        return self._list_children(parts[1], query)
+                    children = json.loads(raw)["children"]
+                    with fake.lock:
+                        created = [{"object": "block", "id": str(uuid.uuid4()), **child} for child in children]
+                        fake.blocks.setdefault(parts[1], []).extend(created)
+                        fake._touch(parts[1])
+                    return self._reply(200, {"object": "list", "results": created})
+                if method == "DELETE" and parts[0] == "blocks":
+                    page_id = parts[1].rsplit("-", 1)[0]
+                    with fake.lock:
+                        fake.blocks[page_id] = [block for block in fake.blocks.get(page_id, [])
+                                                if block["id"] != parts[1]]
+                        fake._touch(page_id)
+                    return self._reply(200, {"object": "block", "id": parts[1], "archived": True})
+                if parts[0] == "file_uploads":
+                    return self._file_upload(method, parts, raw)
+                self._error(404, f"unknown endpoint: {method} {self.path}")
+
+            def _query(self, database_id: str, body: dict) -> None:
+                # カーソルは全ページ中の位置にする（処理中に処理済になったページがあっても後続を読み飛ばさない）
+                position = int(body.get("start_cursor") or 0)
+                page_size = body.get("page_size", 100)
+                results = []
+                with fake.lock:
+                    pages = list(fake.pages.values())
+                    while position < len(pages) and len(results) < page_size:
+                        if pages[position]["parent"]["database_id"] == database_id \
+                                and matches_filter(pages[position], body.get("filter")):
+                            results.append(json.loads(json.dumps(pages[position])))
+                        position += 1
+                has_more = position < len(pages)
+                self._reply(200, {"object": "list", "results": results, "has_more": has_more,
+                                  "next_cursor": str(position) if has_more else None})
+
+            def _list_children(self, block_id: str, query: dict) -> None:
+                start = int(query.get("start_cursor", ["0"])[0])
+                page_size = int(query.get("page_size", ["100"])[0])
+                with fake.lock:
+                    blocks = list(fake.blocks.get(block_id, []))
+                has_more = start + page_size < len(blocks)
+                self._reply(200, {"object": "list", "results": blocks[start:start + page_size], "has_more": has_more,
+                                  "next_cursor": str(start + page_size) if has_more else None})
+
+            def _file_upload(self, method: str, parts: list, raw: bytes) -> None:
+                if len(parts) == 1:
+                    body = json.loads(raw)
+                    upload = {"object": "file_upload", "id": str(uuid.uuid4()), "status": "pending",
+                              "filename": body.get("filename"), "mode": body.get("mode", "single_part"),
+                              "number_of_parts": body.get("number_of_parts"), "parts": set()}
+                    with fake.lock:
+                        fake.file_uploads[upload["id"]] = upload
+                    return self._reply(200, self._public(upload))
+
+                upload = fake.file_uploads[parts[1]]
+                if method == "GET":
+                    return self._reply(200, self._public(upload))
+                if parts[2] == "send":
+                    match = re.search(rb'name="part_number"\r\n\r\n(\d+)', raw[:4096])
+                    with fake.lock:
+                        if upload["mode"] == "multi_part":
+                            if not match:
+                                return self._error(400, "part_number is required")
+                            upload["parts"].add(int(match.group(1)))
+                        else:
+                            upload["status"] = "uploaded"
+                    return self._reply(200, self._public(upload))
+                if parts[2] == "complete":
+                    with fake.lock:
+                        if len(upload["parts"]) != upload["number_of_parts"]:
+                            return self._error(400, "not all parts have been sent")
+                        upload["status"] = "uploaded"
+                    return self._reply(200, self._public(upload))
+                self._error(404, f"unknown endpoint: {method} {self.path}")
+
+            @staticmethod
+            def _public(upload: dict) -> dict:
+                return {key: value for key, value in upload.items() if key != "parts"}
+
+            def _media(self, url) -> None:
+                # 合成データを指定サイズだけ配信する（Rangeによる途中からの再開に対応）
+                # サムネイルは、Pillowがあれば合成データの代わりに本物のJPEGを配信する
+                thumbnail = fake.thumbnail if url.path.endswith(".jpg") else None
+                size = len(thumbnail) if thumbnail else int(parse_qs(url.query)["size"][0])
+                start = 0
+                match = re.match(r"bytes=(\d+)-", self.headers.get("Range", ""))
+                if match:
+                    start = int(match.group(1))
+                    self.send_response(206)
+                    self.send_header("Content-Range", f"bytes {start}-{size - 1}/{size}")
+                else:
+                    self.send_response(200)
+                self.send_header("Content-Type", "image/jpeg" if url.path.endswith(".jpg") else "video/mp4")
+                self.send_header("Content-Length", str(size - start))
+                self.send_header("Accept-Ranges", "bytes")
+                self.end_headers()
+
+                if thumbnail:
+                    try:
+                        self.wfile.write(thumbnail[start:])
+                    except (BrokenPipeError, ConnectionResetError):
+                        pass
+                    return
+                block = os.urandom(256 * 1024)
+                position = start
+                started = time.monotonic()
+                while position < size:
+                    n = min(len(block), size - position)
+                    try:
+                        self.wfile.write(block[:n])
+                    except (BrokenPipeError, ConnectionResetError):
+                        return
+                    position += n
+                    if fake.download_bytes_per_second:
+                        ahead = (position - start) / fake.download_bytes_per_second - (time.monotonic() - started)
+                        if ahead > 0:
+                            time.sleep(ahead)
+
+        return Handler
+
+
+# ======== Stub Extractor ======================================================
+# FakeNotionServer が配信する合成ファイルをダウンロードさせるyt-dlpの抽出器と、それだけを使うYoutubeDLを作る関数
+def make_stub_youtube_dl(media_base_url: str):
+    from yt_dlp import YoutubeDL
+    from yt_dlp.extractor.common import InfoExtractor
+
+    class StubIE(InfoExtractor):
+        IE_NAME = "bench-stub"
+        _VALID_URL = re.escape(STUB_URL_PREFIX) + r"/(?P<id>[^/?#]+)\?size=(?P<size>\d+)"
+
+        def _real_extract(self, url):
+            video_id, size = self._match_valid_url(url).group("id", "size")
+            return {
+                "id": video_id,
+                "title": f"Bench {video_id}",
+                "formats": [{
+                    "format_id": "mp4",
+                    "url": f"{media_base_url}/media/{video_id}.mp4?size={size}",
+                    "ext": "mp4",
+                    "protocol": "http",
+                    "filesize": int(size),
+                    "vcodec": "h264",
+                    "acodec": "aac",
+                }],
+                "thumbnails": [{"url": f"{media_base_url}/media/{video_id}.jpg?size={THUMBNAIL_SIZE}"}],
+            }
+
+    class StubYoutubeDL(YoutubeDL):
+        def __init__(self, params=None, auto_init=True):
+            super().__init__(params, auto_init=False)
+            self.add_info_extractor(StubIE())
+
+    return StubYoutubeDL
+
+
+# ======== Runner ==============================================================
+class MediaWarningCounter(logging.Handler):
+    """ファイルの変換に失敗して元のファイルをアップロードした警告を数えるログハンドラ"""
+    PATTERNS = ("変換できなかった", "再エンコードできなかった")
+
+    def __init__(self):
+        super().__init__(level=logging.WARNING)
+        self.count = 0
+        self.last_message = None
+
+    def emit(self, record: logging.LogRecord) -> None:
+        message = record.getMessage()
+        if any(pattern in message for pattern in self.PATTERNS):
+            self.count += 1
+            self.last_message = message
+
+
+# 子プロセスでスクリプトのパイプラインを実行し、結果をJSONで標準出力の最終行に書く
+def run_child(args: argparse.Namespace) -> None:
+    module = load_script_module()
+    module.YoutubeDL = make_stub_youtube_dl(args.media_base_url)
+    # 変換に失敗しても処理は成功するため、変換されなかったことをログから検出する
+    media_warnings = MediaWarningCounter()
+    logging.getLogger().addHandler(media_warnings)
+
+    started = time.perf_counter()
+    items = module.iter_database_items(module.load_database_configs())
+    if args.workers > 0:
+        succeeded, failed = module.process_items_pipeline(items, args.workers)
+    else:
+        succeeded, failed = module.process_items_sequential(items)
+    seconds = time.perf_counter() - started
+
+    report = module.metrics.report()
+    print(json.dumps({
+        "succeeded": succeeded,
+        "failed": failed,
+        "seconds": seconds,
+        "items_per_second": (succeeded + failed) / seconds if seconds else 0.0,
+        "upload_mb_per_second": report["upload_mb_per_second"],
+        "peak_rss_bytes": max_rss_bytes(),
+        "notion_api": asdict(module.notion.stats()),
+        "media_warnings": media_warnings.count,
+        "media_warning": media_warnings.last_message,
+        "stages": {stage: {key: values[key] for key in ("count", "p50_seconds", "p95_seconds", "mb_per_second")}
+                   for stage, values in report["stages"].items() if not stage.startswith("http ")},
+    }))
+
+
+# 1つのシナリオを実行して結果を返す関数
+def run_scenario(name: str, items: int, video_size: int, args: argparse.Namespace) -> dict:
+    server = FakeNotionServer(
+        items=items, video_size=video_size, blocks_per_page=args.blocks_per_page, latency=args.latency,
+        throttle_rps=args.throttle_rps, throttle_probability=args.throttle_probability,
+        retry_after=args.retry_after, download_bytes_per_second=args.download_mbps * 1024 * 1024,
+        databases=args.databases,
+    )
+    server.start()
+    try:
+        with tempfile.TemporaryDirectory(prefix=f"bench-{name}-") as home:
+            env = {
+                **os.environ,
+                # ~/Downloads をテスト用のディレクトリにする
+                "HOME": home,
+                "LOG_DIR": home,
+                "NOTION_TOKEN": "bench-token",
+                "NOTION_DATABASE_ID": BENCH_DATABASE_ID,
+                "NOTION_API_BASE_URL": f"{server.base_url}/v1",
+                "NOTION_RATE_LIMIT": str(args.rate_limit),
+                "NOTION_RATE_BURST": str(max(1, int(args.rate_limit))),
+                "NOTION_BACKOFF_BASE": "0.1",
+                "JOURNAL_PATH": os.path.join(home, "journal.sqlite3"),
+                "CACHE_PATH": os.path.join(home, "cache.sqlite3"),
+                # ディスクを使い切らないよう、同時に置いておくファイルの合計サイズを制限する
+                "DOWNLOAD_DISK_BUDGET_BYTES": str(args.disk_budget_mb * 1024 * 1024),
+                "DOWNLOAD_CACHE_MAX_BYTES": str(args.disk_budget_mb * 1024 * 1024),
+                "METRICS_REPORT_DIR": "",
+                "METRICS_EVENTS_PATH": "",
+            }
+            if args.databases > 1:
+                # 複数のデータベースをまとめて処理させる
+                config_path = os.path.join(home, "databases.json")
+                with open(config_path, "w") as f:
+                    json.dump([{"name": f"db{n}", "database_id": bench_database_id(n)}
+                               for n in range(args.databases)], f)
+                env["NOTION_DATABASES_PATH"] = config_path
+            command = [sys.executable, __file__, "--child", "--workers", str(args.workers),
+                       "--media-base-url", server.base_url]
+            completed = subprocess.run(command, env=env, capture_output=True, text=True)
+            if completed.returncode != 0:
+                raise RuntimeError(f"シナリオ「{name}」の実行に失敗しました:\n{completed.stderr[-4000:]}")
+            result = json.loads(completed.stdout.strip().splitlines()[-1])
+            if result["media_warnings"]:
+                raise RuntimeError(f"シナリオ「{name}」でファイルの変換に{result['media_warnings']}件失敗しました: "
+                                   f"{result['media_warning']}")
+    finally:
+        server.stop()
+
+    return {"scenario": name, "items": items, "video_bytes": video_size, **result, "server": server.summary()}
+
+
+def print_result(result: dict) -> None:
+    mb = result["video_bytes"] / 1024 / 1024
+    upload = result["upload_mb_per_second"]
+    print(f"{result['scenario']:<12} {result['items']:>5} {mb:>9.1f} {result['succeeded']:>4}/{result['failed']:<3} "
+          f"{result['seconds']:>8.2f} {result['items_per_second']:>8.2f} "
+          f"{upload if upload is not None else 0:>10.1f} {result['peak_rss_bytes'] / 1024 / 1024:>9.1f} "
+          f"{result['notion_api']['requests_sent']:>7} {result['server']['throttled']:>5}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="sample-notion-get-db.py をローカルの疑似Notion APIで計測します。")
+    parser.add_argument("--scenario", action="append", choices=sorted(SCENARIOS),
+                        help="実行するシナリオ（複数指定可、省略時はすべて）")
+    parser.add_argument("--items", type=int, help="任意のシナリオのアイテム数（--size-mbと併用）")
+    parser.add_argument("--size-mb", type=float, help="任意のシナリオの動画1件あたりのサイズ（MB）")
+    parser.add_argument("--scale", type=float, default=1.0, help="シナリオの動画サイズに掛ける倍率")
+    parser.add_argument("--workers", type=int, default=0, help="パイプラインのワーカー数（0の場合は順番に処理）")
+    parser.add_argument("--rate-limit", type=float, default=1000.0,
+                        help="スクリプト側のNotion APIのレート制限（1秒あたり、実際のNotionは3）")
+    parser.add_argument("--latency", type=float, default=0.0, help="Notion APIの応答の遅延（秒）")
+    parser.add_argument("--throttle-rps", type=float, default=0.0, help="サーバー側でこのレートを超えたら429を返す")
+    parser.add_argument("--throttle-probability", type=float, default=0.0, help="サーバーが429を返す確率")
+    parser.add_argument("--retry-after", type=float, default=1.0, help="429のRetry-After（秒）")
+    parser.add_argument("--download-mbps", type=float, default=0.0, help="動画の配信速度の上限（MB/s、0は上限なし）")
+    parser.add_argument("--databases", type=int, default=1,
+                        help="アイテムを振り分けるデータベースの数（2以上でNOTION_DATABASES_PATHを使って一度に処理する）")
+    parser.add_argument("--blocks-per-page", type=int, default=5, help="各ページにあらかじめ作成しておく子ブロックの数")
+    parser.add_argument("--disk-budget-mb", type=int, default=4096, help="ダウンロード中・アップロード待ちのファイルの合計サイズの上限（MB）")
+    parser.add_argument("--json", action="store_true", help="結果をJSONで出力する")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--media-base-url", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(args)
+        return
+
+    if args.items is not None or args.size_mb is not None:
+        scenarios = {f"{args.items or 1}x{args.size_mb or 1:g}MB": (args.items or 1, int((args.size_mb or 1) * 1024 * 1024))}
+    else:
+        scenarios = {name: SCENARIOS[name] for name in (args.scenario or SCENARIOS)}
+
+    if not args.json:
+        print(f"workers: {args.workers}, databases: {args.databases}, rate limit: {args.rate_limit}/s, "
+              f"latency: {args.latency}s, throttle: {args.throttle_rps}/s, scale: {args.scale}")
+        print(f"{'scenario':<12} {'items':>5} {'video MB':>9} {'ok/ng':>8} {'seconds':>8} {'items/s':>8} "
+              f"{'upload MB/s':>10} {'peak MB':>9} {'API req':>7} {'429':>5}")
+    results = []
+    for name, (items, video_size) in scenarios.items():
+        result = run_scenario(name, items, max(1, int(video_size * args.scale)), args)
+        results.append(result)
+        if not args.json:
+            print_result(result)
+    if args.json:
+        print(json.dumps(results, ensure_ascii=False, indent=2))
+
+    if any(result["failed"] or result["server"]["processed_pages"] != result["items"] for result in results):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
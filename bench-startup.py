@@ -0,0 +1,112 @@
+"""
+sample-notion-get-db.py の起動時間を計測するベンチマーク。
+
+Raycastからの実行の多くは未処理のアイテムがなく、データベースを1回クエリして終了します。
+このベンチマークでは bench-notion-get-db.py の FakeNotionServer で空のデータベースを用意し、
+その「処理するものがない実行」について次の2つを計測します。
+
+    wall time  : スクリプト全体の実行時間（複数回の中央値）
+    importtime : python -X importtime で記録した、実行中に読み込まれたモジュールとその読み込み時間
+
+ダウンロード・アップロード用の重いモジュール（yt_dlp など）が読み込まれていた場合や、
+--max-seconds を超えた場合は終了コード1で終了するので、起動時間の退行の検出に使えます。
+
+使い方:
+    python bench-startup.py
+    python bench-startup.py --runs 10 --max-seconds 0.5
+"""
+import argparse
+import importlib.util
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+SCRIPT_PATH = os.path.join(SCRIPT_DIR, "sample-notion-get-db.py")
+# 処理するものがない実行では読み込まれてはいけないモジュール
+FORBIDDEN_MODULES = ["yt_dlp"]
+
+
+# bench-notion-get-db.py をモジュールとして読み込む関数（ファイル名にハイフンを含むため）
+def load_bench_module():
+    path = os.path.join(SCRIPT_DIR, "bench-notion-get-db.py")
+    spec = importlib.util.spec_from_file_location("bench_notion_get_db", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+# -X importtime の出力を解析し、トップレベルで読み込まれたモジュールと累積時間（秒）の一覧を返す関数
+def parse_importtime(stderr: str) -> list[tuple[str, float]]:
+    modules = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        # 字下げされたモジュールは、直前のモジュールから読み込まれたもの
+        if not name[1:].startswith(" "):
+            modules.append((name.strip(), int(cumulative) / 1_000_000))
+    return modules
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="処理するものがない実行の起動時間を計測します。")
+    parser.add_argument("--runs", type=int, default=5, help="実行時間を計測する回数")
+    parser.add_argument("--top", type=int, default=10, help="表示する読み込み時間の長いモジュールの数")
+    parser.add_argument("--max-seconds", type=float, help="実行時間（中央値）の上限。超えた場合は終了コード1")
+    args = parser.parse_args()
+
+    bench = load_bench_module()
+    server = bench.FakeNotionServer(items=0, video_size=0)
+    server.start()
+    try:
+        with tempfile.TemporaryDirectory(prefix="bench-startup-") as home:
+            env = {
+                **os.environ,
+                "HOME": home,
+                "LOG_DIR": home,
+                "NOTION_TOKEN": "bench-token",
+                "NOTION_DATABASE_ID": bench.BENCH_DATABASE_ID,
+                "NOTION_API_BASE_URL": f"{server.base_url}/v1",
+                "JOURNAL_PATH": os.path.join(home, "journal.sqlite3"),
+                "CACHE_PATH": os.path.join(home, "cache.sqlite3"),
+                "METRICS_REPORT_DIR": "",
+                "METRICS_EVENTS_PATH": "",
+            }
+            seconds = []
+            for _ in range(args.runs):
+                started = time.perf_counter()
+                subprocess.run([sys.executable, SCRIPT_PATH], env=env, check=True, stdout=subprocess.DEVNULL)
+                seconds.append(time.perf_counter() - started)
+
+            traced = subprocess.run([sys.executable, "-X", "importtime", SCRIPT_PATH], env=env, check=True,
+                                    stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+            modules = parse_importtime(traced.stderr)
+    finally:
+        server.stop()
+
+    median = statistics.median(seconds)
+    print(f"wall time: median {median:.3f}s, min {min(seconds):.3f}s, max {max(seconds):.3f}s ({args.runs} runs)")
+    print(f"imports: {len(modules)} top-level modules, {sum(s for _, s in modules):.3f}s")
+    for name, cumulative in sorted(modules, key=lambda module: module[1], reverse=True)[:args.top]:
+        print(f"  {cumulative * 1000:>8.1f}ms  {name}")
+
+    failed = False
+    loaded = {name.split(".")[0] for name, _ in modules}
+    for name in FORBIDDEN_MODULES:
+        if name in loaded:
+            print(f"❌ 処理するものがない実行で {name} が読み込まれています。")
+            failed = True
+    if args.max_seconds is not None and median > args.max_seconds:
+        print(f"❌ 実行時間 {median:.3f}s が上限 {args.max_seconds:.3f}s を超えています。")
+        failed = True
+    if failed:
+        sys.exit(1)
+    print("✅ 起動時間の退行はありません。")
+
+
+if __name__ == "__main__":
+    main()
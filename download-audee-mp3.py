@@ -0,0 +1,231 @@
+"""
+AudeeのエピソードのURLからmp3ファイルをまとめてダウンロードするスクリプト。
+
+download-audee-mp3.sh と同じく、エピソードのHTMLから headline（ファイル名）と
+contentUrl（mp3のURL）を取り出し、~/Downloads に「headline（空白と/は_に置換）.mp3」で保存します。
+
+    - 複数のURLを引数で渡すか、--from-notion でNotionデータベースの未処理アイテムのURL
+      （sample-notion-get-db.py と同じデータベース・同じ条件）のうちAudeeのものを対象にします。
+    - HTMLは先頭から少しずつ読み、headline と contentUrl の両方が見つかった時点で読むのをやめます。
+    - mp3は接続プールを共有したセッションで並行してダウンロードします。
+    - ダウンロード中のファイルは「.part」に書き込み、中断された場合は次回にHTTPのRangeで続きから再開します。
+    - 保存先に同じ名前のファイルがすでにあるエピソードはスキップします。
+
+使い方:
+    python download-audee-mp3.py https://audee.jp/voice/show/12345 https://audee.jp/voice/show/12346
+    python download-audee-mp3.py --from-notion --workers 4
+"""
+import argparse
+import codecs
+import importlib.util
+import json
+import os
+import re
+import sys
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+AUDEE_HOST = "audee.jp"
+
+# HTMLを読み込む単位と、チャンクの境界をまたぐ値を見つけるために次のチャンクへ持ち越す文字数
+HTML_CHUNK_SIZE = 16 * 1024
+HTML_CARRY_CHARS = 4096
+# mp3を書き込む単位と、1つのエピソードのダウンロードを（続きから）やり直す回数
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+DOWNLOAD_ATTEMPTS = 3
+
+# download-audee-mp3.sh の sed と同じ値を取り出す（JSONのエスケープされた「"」にも対応）
+HEADLINE_PATTERN = re.compile(r'"headline"\s*:\s*"((?:[^"\\]|\\.)*)"')
+CONTENT_URL_PATTERN = re.compile(r'"contentUrl"\s*:\s*"(https://(?:[^"\\]|\\.)*?\.mp3)"')
+
+
+@dataclass
+class Episode:
+    """エピソードのページURLと、HTMLから取り出したheadlineとmp3のURL"""
+    page_url: str
+    headline: str
+    mp3_url: str
+
+    @property
+    def file_name(self) -> str:
+        # ファイル名を安全に（download-audee-mp3.sh の tr ' /' '__' と同じ）
+        return self.headline.replace(" ", "_").replace("/", "_") + ".mp3"
+
+
+# ログ出力関数
+def log(message: str) -> None:
+    print(message, flush=True)
+
+
+# 接続プールを共有するセッションを作る関数（接続エラーと5xxは自動で再試行する）
+def create_session(pool_size: int) -> requests.Session:
+    session = requests.Session()
+    retry = Retry(total=3, backoff_factor=1, status_forcelist=[500, 502, 503, 504], allowed_methods=["GET"])
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size, max_retries=retry)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+# JSONの文字列リテラルの中身を、エスケープを解いて返す関数
+def unescape_json_string(value: str) -> str:
+    try:
+        return json.loads(f'"{value}"')
+    except ValueError:
+        return value
+
+
+# エピソードのHTMLを先頭から読み、headlineとmp3のURLが見つかった時点で読むのをやめて返す関数
+def fetch_episode(session: requests.Session, page_url: str) -> Episode:
+    """
+    HTMLをHTML_CHUNK_SIZEずつ読み込み、両方の値が見つかったらレスポンスを閉じます。
+    例外:
+        HTMLの取得に失敗した場合や、最後まで読んでも値が見つからなかった場合は例外を投げます。
+    """
+    headline, mp3_url = None, None
+    with session.get(page_url, stream=True, timeout=(10, 30)) as response:
+        response.raise_for_status()
+        # Content-Typeにcharsetがない場合、requestsはtext/htmlをISO-8859-1とみなすため、UTF-8として読む
+        encoding = response.encoding if "charset" in response.headers.get("Content-Type", "").lower() else None
+        decoder = codecs.getincrementaldecoder(encoding or "utf-8")(errors="replace")
+        buffer = ""
+        for chunk in response.iter_content(chunk_size=HTML_CHUNK_SIZE):
+            buffer += decoder.decode(chunk)
+            if headline is None and (match := HEADLINE_PATTERN.search(buffer)):
+                headline = unescape_json_string(match.group(1))
+            if mp3_url is None and (match := CONTENT_URL_PATTERN.search(buffer)):
+                mp3_url = unescape_json_string(match.group(1))
+            if headline is not None and mp3_url is not None:
+                break
+            buffer = buffer[-HTML_CARRY_CHARS:]
+
+    if not headline or not mp3_url:
+        raise Exception(f"headline または MP3 URL が見つかりませんでした: {page_url}")
+    return Episode(page_url=page_url, headline=headline, mp3_url=mp3_url)
+
+
+# mp3を「.part」に書き込みながらダウンロードし、完了したら保存先の名前に変更する関数
+def download_mp3(session: requests.Session, episode: Episode, output_path: str) -> int:
+    """
+    「.part」がすでにあれば、Rangeでその続きからダウンロードします。
+    サーバーがRangeに対応していない場合は最初からダウンロードし直します。
+    戻り値:
+        int: このダウンロードで受信したバイト数。
+    例外:
+        DOWNLOAD_ATTEMPTS回やり直してもダウンロードできなかった場合は例外を投げます。
+    """
+    part_path = output_path + ".part"
+    received = 0
+    error = None
+    for _ in range(DOWNLOAD_ATTEMPTS):
+        offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+        headers = {"Range": f"bytes={offset}-"} if offset else {}
+        try:
+            with session.get(episode.mp3_url, headers=headers, stream=True, timeout=(10, 60)) as response:
+                if response.status_code == 416:
+                    # 「.part」がすでに最後まで書き込まれている
+                    break
+                response.raise_for_status()
+                if offset and response.status_code != 206:
+                    log(f"⚠️ Rangeに対応していないため、最初からダウンロードし直します: {episode.file_name}")
+                    offset = 0
+                total = None
+                if response.status_code == 206 and "/" in response.headers.get("Content-Range", ""):
+                    total = response.headers["Content-Range"].rsplit("/", 1)[1]
+                elif "Content-Length" in response.headers:
+                    total = response.headers["Content-Length"]
+                total = int(total) if total and total.isdigit() else None
+
+                with open(part_path, "ab" if offset else "wb") as f:
+                    for chunk in response.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
+                        f.write(chunk)
+                        received += len(chunk)
+            if total is not None and os.path.getsize(part_path) < total:
+                raise Exception(f"途中で接続が切れました（{os.path.getsize(part_path)}/{total}バイト）")
+            break
+        except Exception as e:
+            error = e
+            log(f"⚠️ ダウンロードを続きから再開します: {episode.file_name}: {e}")
+    else:
+        raise Exception(f"mp3のダウンロードに失敗しました: {error}")
+
+    os.replace(part_path, output_path)
+    return received
+
+
+# 1つのエピソードを処理して、結果（"downloaded" / "skipped"）を返す関数
+def process_episode(session: requests.Session, page_url: str, output_dir: str) -> str:
+    episode = fetch_episode(session, page_url)
+    output_path = os.path.join(output_dir, episode.file_name)
+    if os.path.exists(output_path):
+        log(f"✅ ダウンロード済みのためスキップします: {output_path}")
+        return "skipped"
+
+    log(f"💾 Saving as: {output_path}")
+    received = download_mp3(session, episode, output_path)
+    log(f"✅ ダウンロードが完了しました: {output_path}（{received / 1024 / 1024:.1f}MB）")
+    return "downloaded"
+
+
+# sample-notion-get-db.py を使って、Notionデータベース（NOTION_DATABASES_PATHの設定があればそのすべて）の未処理アイテムからAudeeのURLを取得する関数
+def get_urls_from_notion() -> list:
+    # ファイル名にハイフンを含むため、importlibで読み込む
+    path = os.path.join(SCRIPT_DIR, "sample-notion-get-db.py")
+    spec = importlib.util.spec_from_file_location("sample_notion_get_db", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+
+    urls = []
+    for database, item in module.iter_database_items(module.load_database_configs()):
+        url = module.get_item_propertie_url(item, database.url_property)
+        host = (urlparse(url).hostname or "") if url else ""
+        if host == AUDEE_HOST or host.endswith("." + AUDEE_HOST):
+            urls.append(url)
+    return urls
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="AudeeのURLからmp3ファイルをまとめてダウンロードします。")
+    parser.add_argument("urls", nargs="*", help="AudeeのエピソードのURL")
+    parser.add_argument("--from-notion", action="store_true",
+                        help="Notionデータベースの未処理アイテムのうち、AudeeのURLも対象にする")
+    parser.add_argument("--output-dir", default="~/Downloads", help="保存先ディレクトリ")
+    parser.add_argument("--workers", type=int, default=4, help="同時にダウンロードするエピソード数")
+    args = parser.parse_args()
+
+    urls = list(args.urls)
+    if args.from_notion:
+        urls += get_urls_from_notion()
+    # 同じURLは1回だけ処理する
+    urls = list(dict.fromkeys(urls))
+    if not urls:
+        log("❌ ダウンロードするAudeeのURLがありません。")
+        sys.exit(1)
+
+    output_dir = os.path.expanduser(args.output_dir)
+    os.makedirs(output_dir, exist_ok=True)
+    workers = max(1, args.workers)
+    results = {"downloaded": 0, "skipped": 0, "failed": 0}
+
+    with create_session(workers * 2) as session, ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(process_episode, session, url, output_dir): url for url in urls}
+        for future in as_completed(futures):
+            try:
+                results[future.result()] += 1
+            except Exception as e:
+                log(f"❌ {futures[future]}: {e}")
+                results["failed"] += 1
+
+    log(f"ダウンロード: {results['downloaded']}件、スキップ: {results['skipped']}件、失敗: {results['failed']}件")
+    if results["failed"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,30 @@
-from notion_client import Client
 from dotenv import load_dotenv
 import os
 import datetime
-from yt_dlp import YoutubeDL
-import requests
-import json
-from dataclasses import dataclass
+from dataclasses import dataclass, asdict, field
+import email.utils
 import logging
+import itertools
+import argparse
+import queue
+import threading
+import time
+import random
+import signal
+import mmap
+import uuid
+import sqlite3
+import hashlib
+import shutil
+import subprocess
+import json
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from urllib.parse import urlparse
+from typing import Callable, Iterable, Iterator, Optional, Union
+
+# yt-dlpは読み込みに0.1秒以上かかるため、ダウンロードするときに load_youtube_dl() で読み込む
+YoutubeDL = None
 
 # ======== Config Begin ========================================================
 # .envを読み込む
@@ -14,9 +32,84 @@ load_dotenv()
 # 環境変数として取得
 NOTION_TOKEN = os.getenv("NOTION_TOKEN")
 NOTION_DATABASE_ID = os.getenv("NOTION_DATABASE_ID")
+# 複数のデータベースを処理する場合の設定ファイル（JSON）のパス。空の場合は NOTION_DATABASE_ID だけを処理する
+NOTION_DATABASES_PATH = os.path.expanduser(os.getenv("NOTION_DATABASES_PATH", ""))
 NOTION_VERSION = "2022-06-28"
+NOTION_API_BASE_URL = os.getenv("NOTION_API_BASE_URL", "https://api.notion.com/v1")
+# Notion APIとの接続プールのサイズ（同時に張るkeep-alive接続の上限）
+NOTION_POOL_SIZE = int(os.getenv("NOTION_POOL_SIZE", "16"))
+# Notion APIの接続タイムアウトと読み取りタイムアウト（秒）
+NOTION_CONNECT_TIMEOUT = float(os.getenv("NOTION_CONNECT_TIMEOUT", "10"))
+NOTION_READ_TIMEOUT = float(os.getenv("NOTION_READ_TIMEOUT", "120"))
+# Notion APIへのリクエストレート（1秒あたりのリクエスト数）の初期値と上限、およびバースト数
+NOTION_RATE_LIMIT = float(os.getenv("NOTION_RATE_LIMIT", "3"))
+NOTION_RATE_BURST = int(os.getenv("NOTION_RATE_BURST", "3"))
+# 429/5xx/通信エラーの場合の再試行回数と、バックオフの基準・上限（秒）
+NOTION_MAX_RETRIES = int(os.getenv("NOTION_MAX_RETRIES", "5"))
+NOTION_BACKOFF_BASE = float(os.getenv("NOTION_BACKOFF_BASE", "1"))
+NOTION_BACKOFF_MAX = float(os.getenv("NOTION_BACKOFF_MAX", "30"))
+# データベースクエリ1回あたりの取得件数（Notion APIの上限は100）
+NOTION_QUERY_PAGE_SIZE = 100
+# パイプライン処理の各ステージのワーカー数（0の場合は1件ずつ順番に処理する）
+PIPELINE_WORKERS = int(os.getenv("PIPELINE_WORKERS", "0"))
+# single_partでアップロードできるファイルサイズの上限（20MB、Notion APIの仕様）
+SINGLE_PART_MAX_BYTES = 20 * 1024 * 1024
+# マルチパートアップロードの1パートのサイズ（10MB）
+MULTIPART_CHUNK_SIZE = 10 * 1024 * 1024
+# 1ファイルで出力される形式の動画は、ダウンロードしながらパートごとにアップロードする（1: 有効、0: 無効）
+STREAMING_UPLOAD = os.getenv("STREAMING_UPLOAD", "1") == "1"
+# マルチパートアップロードで同時に送信するパート数
+UPLOAD_PARALLELISM = int(os.getenv("UPLOAD_PARALLELISM", "4"))
+# ページコンテンツの削除で同時に削除するブロック数
+DELETE_CONCURRENCY = int(os.getenv("DELETE_CONCURRENCY", "3"))
 LOG_DIR = os.getenv("LOG_DIR", "~")
 
+# 処理の進捗を記録するジャーナル（SQLite）のパス。中断後の再実行で途中から再開するために使う
+JOURNAL_PATH = os.path.expanduser(os.getenv("JOURNAL_PATH", f"{LOG_DIR}/sample-notion-get-db-journal.sqlite3"))
+# ダウンロード・アップロードキャッシュ（SQLite）のパスと、キャッシュするダウンロードファイルの合計サイズの上限
+CACHE_PATH = os.path.expanduser(os.getenv("CACHE_PATH", f"{LOG_DIR}/sample-notion-get-db-cache.sqlite3"))
+DOWNLOAD_CACHE_MAX_BYTES = int(os.getenv("DOWNLOAD_CACHE_MAX_BYTES", str(20 * 1024 ** 3)))
+
+# ダウンロード中・アップロード待ちのファイルの合計サイズの上限（バイト、0の場合は上限なし）。超える場合は次のダウンロードを待たせる
+DOWNLOAD_DISK_BUDGET_BYTES = int(os.getenv("DOWNLOAD_DISK_BUDGET_BYTES", str(10 * 1024 ** 3)))
+# ダウンロード先に最低限残しておく空き容量（バイト）と、サイズが不明な動画の見積もりサイズ（バイト）
+DOWNLOAD_MIN_FREE_BYTES = int(os.getenv("DOWNLOAD_MIN_FREE_BYTES", str(1024 ** 3)))
+DOWNLOAD_UNKNOWN_SIZE_BYTES = int(os.getenv("DOWNLOAD_UNKNOWN_SIZE_BYTES", str(500 * 1024 ** 2)))
+# Notionへの添付が完了したファイルの扱い（delete: 削除、archive: ARCHIVE_DIRへ移動、cache: キャッシュに残す）
+POST_UPLOAD_ACTION = os.getenv("POST_UPLOAD_ACTION", "delete")
+ARCHIVE_DIR = os.path.expanduser(os.getenv("ARCHIVE_DIR", "~/Downloads/notion-archive"))
+# すべてのダウンロード・アップロードを合わせた帯域の上限（バイト/秒、0の場合は上限なし）
+DOWNLOAD_BANDWIDTH_LIMIT = float(os.getenv("DOWNLOAD_BANDWIDTH_LIMIT", "0"))
+UPLOAD_BANDWIDTH_LIMIT = float(os.getenv("UPLOAD_BANDWIDTH_LIMIT", "0"))
+
+# HLS/DASHなどの動画で、1つのダウンロード内で同時に取得するフラグメント数（SOURCE_POLICIESで指定のないホスト）
+DOWNLOAD_CONCURRENT_FRAGMENTS = int(os.getenv("DOWNLOAD_CONCURRENT_FRAGMENTS", "4"))
+# ホストごとの設定（SOURCE_POLICIES の表）をJSONで上書き・追加する（例: {"x.com": {"max_concurrent_items": 2}}）
+SOURCE_POLICIES_JSON = os.getenv("SOURCE_POLICIES_JSON", "")
+
+# アップロード前にサムネイルの変換や動画の再エンコードを行うプロセス数（0の場合はメインプロセスで実行）
+MEDIA_PREP_WORKERS = int(os.getenv("MEDIA_PREP_WORKERS", "2"))
+# サムネイルの長辺の上限（ピクセル）と保存形式（jpeg/webp/png）、品質。Pillowがない場合は変換しない（0で無効）
+THUMBNAIL_MAX_SIZE = int(os.getenv("THUMBNAIL_MAX_SIZE", "1280"))
+THUMBNAIL_FORMAT = os.getenv("THUMBNAIL_FORMAT", "jpeg")
+THUMBNAIL_QUALITY = int(os.getenv("THUMBNAIL_QUALITY", "85"))
+# このサイズ（バイト）を超える動画を、ffmpegで指定のビットレートに再エンコードしてからアップロードする（0の場合は無効）
+VIDEO_TRANSCODE_MAX_BYTES = int(os.getenv("VIDEO_TRANSCODE_MAX_BYTES", "0"))
+VIDEO_TRANSCODE_VIDEO_BITRATE = os.getenv("VIDEO_TRANSCODE_VIDEO_BITRATE", "2M")
+VIDEO_TRANSCODE_AUDIO_BITRATE = os.getenv("VIDEO_TRANSCODE_AUDIO_BITRATE", "128k")
+FFMPEG_PATH = os.getenv("FFMPEG_PATH", "ffmpeg")
+
+# ステージごとの処理時間などを記録した実行レポート（JSON）の出力先ディレクトリ（空の場合は出力しない）
+METRICS_REPORT_DIR = os.getenv("METRICS_REPORT_DIR", LOG_DIR)
+# 計測イベントをJSON Linesで逐次出力するファイルのパス（空の場合は出力しない）
+METRICS_EVENTS_PATH = os.getenv("METRICS_EVENTS_PATH", "")
+
+# --watch のポーリング間隔（秒）。アイテムがない間は最小値から最大値まで倍々に延ばす
+WATCH_POLL_MIN_SECONDS = float(os.getenv("WATCH_POLL_MIN_SECONDS", "5"))
+WATCH_POLL_MAX_SECONDS = float(os.getenv("WATCH_POLL_MAX_SECONDS", "300"))
+# --watch で未処理のアイテムをすべて取得し直す間隔（秒）。失敗したアイテムはこのときに再試行する
+WATCH_FULL_SYNC_SECONDS = float(os.getenv("WATCH_FULL_SYNC_SECONDS", "3600"))
+
 # ログ設定
 today = datetime.datetime.now().strftime("%Y%m%d")
 log_path = os.path.expanduser(f"{LOG_DIR}/sample-notion-get-db-log-{today}.txt")
@@ -28,7 +121,18 @@ logging.basicConfig(
 )
 
 # ======== Config End ==========================================================
-notion = Client(auth=NOTION_TOKEN)
+
+# ログ出力関数
+def log(message: str, level: str = "info") -> None:
+    print(message)
+    if level == "info":
+        logging.info(message)
+    elif level == "error":
+        logging.error(message)
+    elif level == "warning":
+        logging.warning(message)
+    else:
+        logging.debug(message)
 
 @dataclass
 class VideoInfo:
@@ -39,10 +143,12 @@ class VideoInfo:
         video_title (str): 動画のタイトル。
         video_filepath (str): 動画ファイルのパス。
         thumbnail_filepath (str): サムネイル画像のファイルパス。
+        cache_key (str | None): ダウンロードキャッシュのキー（「抽出器:動画ID」）。
     """
     video_title: str
     video_filepath: str
     thumbnail_filepath: str
+    cache_key: Optional[str] = None
 
 @dataclass
 class MimeTypeInfo:
@@ -56,62 +162,1564 @@ class MimeTypeInfo:
     mime_type: str
     file_type: str
 
-# ログ出力関数
-def log(message: str, level: str = "info") -> None:
-    print(message)
-    if level == "info":
-        logging.info(message)
-    elif level == "error":
-        logging.error(message)
-    elif level == "warning":
-        logging.warning(message)
-    else:
-        logging.debug(message)
+@dataclass
+class DatabaseConfig:
+    """
+    処理対象のNotionデータベースと、そのプロパティ名の対応を表すデータクラス。
 
-# Notionデータベースからアイテムを取得する関数
-def get_items(database_id) -> list:
-    try:
-        response = notion.databases.query(
-            database_id=database_id,
-            # プロパティ「処理済」が未チェックのアイテムを取得
-            filter={
-                "property": "処理済",
-                "checkbox": {
-                    "equals": False
-                }
+    属性:
+        database_id (str): NotionデータベースのID。
+        name (str): ログに表示する名前（省略時はdatabase_id）。
+        url_property (str): 動画のURLを入れるURLプロパティの名前。
+        processed_property (str): 処理済みかどうかを表すチェックボックスプロパティの名前。
+        title_property (str): 動画のタイトルに変更するタイトルプロパティの名前。
+    """
+    database_id: Optional[str] = NOTION_DATABASE_ID
+    name: str = ""
+    url_property: str = "URL"
+    processed_property: str = "処理済"
+    title_property: str = "title"
+
+    def __post_init__(self):
+        self.name = self.name or self.database_id
+
+@dataclass
+class ItemTask:
+    """
+    1アイテム分の処理状態を保持し、各処理ステップの間で受け渡すためのデータクラス。
+
+    属性:
+        item (dict): Notionのページオブジェクト。
+        url (str): アイテムのURLプロパティの値。
+        database (DatabaseConfig): アイテムのデータベースと、そのプロパティ名。
+        video_info (Optional[VideoInfo]): ダウンロード後に設定される動画の情報。
+        started (float): 処理を開始した時刻（time.perf_counter）。アイテム単位の所要時間の計測に使用。
+        reserved_bytes (int): ダウンロードのためにdisk_budgetから確保しているバイト数。
+    """
+    item: dict
+    url: str
+    database: DatabaseConfig = field(default_factory=DatabaseConfig)
+    video_info: Optional[VideoInfo] = None
+    started: float = field(default_factory=time.perf_counter)
+    reserved_bytes: int = 0
+
+    @property
+    def item_id(self) -> str:
+        return self.item["id"]
+
+# ファイルの一部をmultipart/form-dataとしてコピーせずに送信するためのリクエストボディ
+class MultipartFileBody:
+    """
+    ファイルの指定範囲をmultipart/form-dataのリクエストボディとして読み出すファイルライクオブジェクト。
+
+    ファイルの指定範囲をmmapし、read()ではそのmemoryviewのスライスをそのまま返すため、
+    パート全体をbytesとして読み込んだり、multipart全体を組み立てたりはしません。
+    送信済みの範囲はページキャッシュから解放するので、1パートあたりのメモリ使用量は
+    パートサイズに関係なくほぼ一定（ヘッダーと送信中のブロック分）です。
+
+    requestsには data= に渡し、Content-Type ヘッダーには content_type 属性を指定します。
+    seek(0) で先頭に戻せるため、同じオブジェクトで再送できます。
+
+    source にはファイルパスのほか、開いているファイルディスクリプタも渡せます（閉じるのは呼び出し元）。
+    書き込み中のファイルを送信する場合は use_mmap=False とし、os.pread でブロックごとに読み出します
+    （ファイルが切り詰められた場合にmmapではSIGBUSになるため）。
+    limiter を渡した場合は、読み出すたびにそのバイト数を消費し、送信速度を上限以下に抑えます。
+    """
+    READ_BLOCK_SIZE = 256 * 1024
+
+    def __init__(self, source: Union[str, int], offset: int, length: int, file_name: str, mime_type: str,
+                 fields: Optional[dict] = None, use_mmap: bool = True,
+                 limiter: Optional["BandwidthLimiter"] = None):
+        boundary = uuid.uuid4().hex
+        self.content_type = f"multipart/form-data; boundary={boundary}"
+
+        # 通常のフォームフィールド（part_numberなど）とファイルパートのヘッダー
+        preamble = b""
+        for name, value in (fields or {}).items():
+            preamble += (
+                f"--{boundary}\r\n"
+                f"Content-Disposition: form-data; name=\"{name}\"\r\n\r\n"
+                f"{value}\r\n"
+            ).encode("utf-8")
+        quoted_name = file_name.replace("\"", "%22").replace("\r", "%0D").replace("\n", "%0A")
+        preamble += (
+            f"--{boundary}\r\n"
+            f"Content-Disposition: form-data; name=\"file\"; filename=\"{quoted_name}\"\r\n"
+            f"Content-Type: {mime_type}\r\n\r\n"
+        ).encode("utf-8")
+        epilogue = f"\r\n--{boundary}--\r\n".encode("utf-8")
+
+        if isinstance(source, int):
+            self._fd, self._owns_fd = source, False
+        else:
+            self._fd, self._owns_fd = os.open(source, os.O_RDONLY), True
+        self._offset = offset
+        self._mmap = None
+        self._payload = None
+        if length > 0 and use_mmap:
+            # mmapのoffsetはALLOCATIONGRANULARITYの倍数である必要があるため、手前に揃えてマップする
+            map_offset = offset - offset % mmap.ALLOCATIONGRANULARITY
+            self._mmap = mmap.mmap(self._fd, offset - map_offset + length,
+                                   offset=map_offset, access=mmap.ACCESS_READ)
+            self._payload_start = offset - map_offset
+            self._payload = memoryview(self._mmap)[self._payload_start:self._payload_start + length]
+
+        self._preamble = memoryview(preamble)
+        self._epilogue = memoryview(epilogue)
+        self._payload_length = length
+        self._length = len(preamble) + length + len(epilogue)
+        self._position = 0
+        self._released = 0
+        self._limiter = limiter
+
+    def __len__(self) -> int:
+        return self._length
+
+    def __enter__(self) -> "MultipartFileBody":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def __iter__(self) -> Iterator[memoryview]:
+        while True:
+            block = self.read(self.READ_BLOCK_SIZE)
+            if not block:
+                return
+            yield block
+
+    def tell(self) -> int:
+        return self._position
+
+    def seek(self, position: int, whence: int = os.SEEK_SET) -> int:
+        if whence == os.SEEK_CUR:
+            position += self._position
+        elif whence == os.SEEK_END:
+            position += self._length
+        self._position = max(0, min(position, self._length))
+        return self._position
+
+    def read(self, size: int = -1) -> Union[memoryview, bytes]:
+        """現在位置から最大size（省略時はREAD_BLOCK_SIZE）バイトを返します。"""
+        if size is None or size < 0:
+            size = self.READ_BLOCK_SIZE
+        self._release_sent_pages()
+
+        position = self._position
+        if position < len(self._preamble):
+            block = self._preamble[position:position + size]
+        elif position - len(self._preamble) < self._payload_length:
+            position -= len(self._preamble)
+            size = min(size, self._payload_length - position)
+            if self._payload is not None:
+                block = self._payload[position:position + size]
+            else:
+                block = os.pread(self._fd, size, self._offset + position)
+                if len(block) < size:
+                    raise OSError("送信中にファイルが切り詰められました")
+        else:
+            position -= len(self._preamble) + self._payload_length
+            block = self._epilogue[position:position + size]
+        self._position += len(block)
+        if self._limiter is not None:
+            self._limiter.consume(len(block))
+        return block
+
+    def _release_sent_pages(self) -> None:
+        # 前回までに返した範囲はすでに送信済みなので、そのページをRSSから外す
+        if self._mmap is None or not hasattr(mmap, "MADV_DONTNEED"):
+            return
+        sent = self._position - len(self._preamble) + self._payload_start
+        sent -= sent % mmap.PAGESIZE
+        if sent > self._released:
+            self._mmap.madvise(mmap.MADV_DONTNEED, self._released, sent - self._released)
+            self._released = sent
+
+    def close(self) -> None:
+        for segment in (self._preamble, self._payload, self._epilogue):
+            if segment is not None:
+                segment.release()
+        if self._mmap is not None:
+            try:
+                self._mmap.close()
+            except BufferError:
+                # 送信側がまだスライスを参照している場合は、参照が消えた時点で解放される
+                pass
+        if self._owns_fd:
+            os.close(self._fd)
+
+# ======== Metrics Begin =======================================================
+@dataclass
+class Span:
+    """
+    1回の処理（ステージやHTTPリクエスト）の計測結果。
+
+    属性:
+        stage (str): ステージ名（例: 'download', 'http file_uploads.send'）。
+        started (float): 開始時刻（time.perf_counter）。
+        seconds (float): 所要時間（秒）。
+        bytes (int): 転送したバイト数。
+        retries (int): 再試行した回数。
+        ok (bool): 成功したかどうか。
+    """
+    stage: str
+    started: float
+    seconds: float = 0.0
+    bytes: int = 0
+    retries: int = 0
+    ok: bool = True
+
+class RunMetrics:
+    """
+    実行中の各ステージとHTTPリクエストの所要時間・転送量・再試行回数を記録するクラス。
+
+    span() で処理を囲むと計測結果が記録され、report() でステージごとの件数、p50/p95、
+    転送速度（MB/s）を集計した実行レポートを返します。reset() で記録をリセットできます。events_pathを指定すると、
+    計測結果を1件ずつJSON Linesで出力します。1件あたりの記録は数十バイトで、スレッドセーフです。
+
+    引数:
+        events_path (str): 計測イベントの出力先（空の場合は出力しない）。
+    """
+    def __init__(self, events_path: str = ""):
+        self.started_at = datetime.datetime.now()
+        self._started = time.perf_counter()
+        self._spans = {}
+        self._lock = threading.Lock()
+        self._events = open(os.path.expanduser(events_path), "a", buffering=1) if events_path else None
+
+    @contextmanager
+    def span(self, stage: str, **attrs) -> Iterator[Span]:
+        """処理を計測するコンテキストマネージャ。転送量や再試行回数は返されるSpanに加算します。"""
+        span = Span(stage=stage, started=time.perf_counter())
+        try:
+            yield span
+        except BaseException:
+            span.ok = False
+            raise
+        finally:
+            span.seconds = time.perf_counter() - span.started
+            self.record(span, **attrs)
+
+    def record(self, span: Span, **attrs) -> None:
+        with self._lock:
+            self._spans.setdefault(span.stage, []).append(span)
+            if self._events is not None:
+                self._events.write(json.dumps({
+                    "time": datetime.datetime.now().isoformat(),
+                    "stage": span.stage,
+                    "seconds": round(span.seconds, 6),
+                    "bytes": span.bytes,
+                    "retries": span.retries,
+                    "ok": span.ok,
+                    **attrs
+                }, ensure_ascii=False) + "\n")
+
+    def report(self) -> dict:
+        """ステージごとの集計結果を返します。"""
+        with self._lock:
+            spans_by_stage = {stage: list(spans) for stage, spans in self._spans.items()}
+
+        stages = {}
+        for stage, spans in sorted(spans_by_stage.items()):
+            durations = sorted(span.seconds for span in spans)
+            total_bytes = sum(span.bytes for span in spans)
+            # 並行して実行された区間は重ねて数えない（実際に処理していた経過時間）
+            busy_seconds = 0.0
+            busy_until = 0.0
+            for span in sorted(spans, key=lambda span: span.started):
+                end = span.started + span.seconds
+                busy_seconds += max(0.0, end - max(span.started, busy_until))
+                busy_until = max(busy_until, end)
+            stages[stage] = {
+                "count": len(spans),
+                "errors": sum(1 for span in spans if not span.ok),
+                "retries": sum(span.retries for span in spans),
+                "total_seconds": round(sum(durations), 3),
+                "busy_seconds": round(busy_seconds, 3),
+                "p50_seconds": round(percentile(durations, 50), 3),
+                "p95_seconds": round(percentile(durations, 95), 3),
+                "max_seconds": round(durations[-1], 3),
+                "bytes": total_bytes,
+                "mb_per_second": round(total_bytes / 1024 / 1024 / busy_seconds, 2) if busy_seconds and total_bytes else None,
             }
+
+        upload = stages.get("http file_uploads.send", {})
+        return {
+            "started_at": self.started_at.isoformat(),
+            "seconds": round(time.perf_counter() - self._started, 3),
+            "upload_mb_per_second": upload.get("mb_per_second"),
+            "stages": stages,
+        }
+
+    def write_report(self, report_dir: str, **extra) -> Optional[str]:
+        """実行レポートをJSONで書き出し、そのパスを返します。"""
+        if not report_dir:
+            return None
+        report_dir = os.path.expanduser(report_dir)
+        os.makedirs(report_dir, exist_ok=True)
+        path = os.path.join(report_dir, f"sample-notion-get-db-report-{self.started_at:%Y%m%d-%H%M%S}.json")
+        with open(path, "w") as f:
+            json.dump({**self.report(), **extra}, f, ensure_ascii=False, indent=2)
+        return path
+
+    def reset(self) -> None:
+        """記録した計測結果を破棄し、次の集計の開始時刻を現在にします（--watchでポーリングごとに集計するため）。"""
+        with self._lock:
+            self._spans = {}
+            self.started_at = datetime.datetime.now()
+            self._started = time.perf_counter()
+
+    def close(self) -> None:
+        if self._events is not None:
+            self._events.close()
+
+# ソート済みのリストのパーセンタイル（最近傍順位法）を返す関数
+def percentile(sorted_values: list, percent: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = max(0, -(-len(sorted_values) * percent // 100) - 1)
+    return sorted_values[int(index)]
+
+metrics = RunMetrics(METRICS_EVENTS_PATH)
+
+# ======== Metrics End =========================================================
+
+# ======== Notion Transport Begin ==============================================
+@dataclass
+class RateLimiterStats:
+    """
+    Notion APIへのリクエストの統計情報。
+
+    属性:
+        requests_sent (int): 送信したリクエスト数（再試行を含む）。
+        throttled (int): 429（レート制限）を受けた回数。
+        retried (int): 再試行した回数。
+        wait_seconds (float): レート制限とバックオフで待機した合計秒数（全スレッドの合計）。
+        current_rate (float): 現在のリクエストレート（1秒あたり）。
+    """
+    requests_sent: int = 0
+    throttled: int = 0
+    retried: int = 0
+    wait_seconds: float = 0.0
+    current_rate: float = 0.0
+
+class RateLimiter:
+    """
+    すべてのNotion APIリクエストで共有するトークンバケット方式のレート制限。
+
+    429を受けるとRetry-Afterの間はすべてのリクエストを止め、レートを半分に下げます。
+    その後はリクエストが成功するたびにレートを少しずつ戻します（上限はmax_rate）。
+
+    引数:
+        rate (float): 1秒あたりのリクエスト数の初期値かつ上限。
+        burst (int): バケットに貯められるトークン数（連続して送信できるリクエスト数）。
+        min_rate (float): 429を受けてレートを下げる場合の下限。
+        recovery_step (float | None): 成功1回ごとに戻すレート。省略時はrateの2%。
+    """
+    def __init__(self, rate: float = NOTION_RATE_LIMIT, burst: int = NOTION_RATE_BURST,
+                 min_rate: float = 0.5, recovery_step: Optional[float] = None):
+        self.max_rate = rate
+        self.min_rate = min(min_rate, rate)
+        self.recovery_step = recovery_step if recovery_step is not None else rate * 0.02
+        self.burst = max(1, burst)
+        self.stats = RateLimiterStats(current_rate=rate)
+        self._rate = rate
+        self._tokens = float(self.burst)
+        self._updated_at = time.monotonic()
+        self._blocked_until = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        """トークンを1つ取得できるまで待機します。"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated_at) * self._rate)
+                self._updated_at = now
+                if now < self._blocked_until:
+                    wait = self._blocked_until - now
+                elif self._tokens >= 1:
+                    self._tokens -= 1
+                    self.stats.requests_sent += 1
+                    return
+                else:
+                    wait = (1 - self._tokens) / self._rate
+                self.stats.wait_seconds += wait
+            time.sleep(wait)
+
+    def on_throttled(self, retry_after: float) -> None:
+        """429を受けた場合に呼び出し、retry_after秒間すべてのリクエストを止めてレートを下げます。"""
+        with self._lock:
+            self._blocked_until = max(self._blocked_until, time.monotonic() + retry_after)
+            self._tokens = 0
+            self._rate = max(self.min_rate, self._rate / 2)
+            self.stats.throttled += 1
+            self.stats.current_rate = self._rate
+
+    def on_success(self) -> None:
+        """リクエストが成功した場合に呼び出し、レートを少しずつ上限まで戻します。"""
+        with self._lock:
+            self._rate = min(self.max_rate, self._rate + self.recovery_step)
+            self.stats.current_rate = self._rate
+
+    def on_retry(self, wait: float = 0.0) -> None:
+        with self._lock:
+            self.stats.retried += 1
+            self.stats.wait_seconds += wait
+
+    def snapshot(self) -> RateLimiterStats:
+        with self._lock:
+            return RateLimiterStats(**asdict(self.stats))
+
+# Retry-Afterヘッダーの値（秒数またはHTTP日付）を秒数に変換する関数
+def parse_retry_after(value: Optional[str], default: float) -> float:
+    if not value:
+        return default
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = email.utils.parsedate_to_datetime(value)
+        return max(0.0, retry_at.timestamp() - time.time())
+    except (TypeError, ValueError):
+        return default
+
+class NotionTransport:
+    """
+    Notion APIへのすべてのリクエストを送信するクラス。
+
+    keep-aliveの接続プールを持つrequests.Sessionを1つだけ（最初のリクエストの時点で）作成し、認証ヘッダーもここで設定するため、
+    データベースのクエリ、ページ・ブロックの更新、ファイルアップロードのすべてで
+    パート間・呼び出し間・アイテム間の接続が再利用されます。スレッドセーフです。
+    すべてのリクエストは共有のRateLimiterを通して送信され、429はRetry-Afterに従って、
+    5xxと通信エラーはジッター付きの指数バックオフで再試行します。
+    ブロックの追加やファイルアップロードの作成など、2回送ると結果が重複するリクエスト（idempotent=False）は、
+    429と、送信前に接続できなかった場合だけ再試行します（それ以外はジャーナルからの再開に任せます）。
+
+    引数:
+        token (str): Notionのインテグレーショントークン。
+        base_url (str): Notion APIのベースURL。
+        pool_size (int): 接続プールのサイズ。これを超える同時リクエストは接続が空くまで待機します。
+        timeout (tuple[float, float]): (接続タイムアウト, 読み取りタイムアウト) の秒数。
+        rate_limiter (RateLimiter | None): 共有するレート制限。省略時は新しく作成します。
+        max_retries (int): 429/5xx/通信エラーの場合の再試行回数。
+    """
+    def __init__(self, token: str, base_url: str = NOTION_API_BASE_URL,
+                 pool_size: int = NOTION_POOL_SIZE,
+                 timeout: tuple[float, float] = (NOTION_CONNECT_TIMEOUT, NOTION_READ_TIMEOUT),
+                 rate_limiter: Optional[RateLimiter] = None, max_retries: int = NOTION_MAX_RETRIES):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.rate_limiter = rate_limiter or RateLimiter()
+        self.max_retries = max_retries
+        self._token = token
+        self._pool_size = pool_size
+        self._session = None
+        self._session_lock = threading.Lock()
+
+    def _get_session(self):
+        # requestsは読み込みに0.1秒近くかかるため、最初のリクエストの時点で読み込んで接続プールを作る
+        with self._session_lock:
+            if self._session is None:
+                import requests
+                from requests.adapters import HTTPAdapter
+
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self._pool_size, pool_block=True)
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                session.headers.update({
+                    "Authorization": f"Bearer {self._token}",
+                    "Notion-Version": NOTION_VERSION,
+                    "accept": "application/json",
+                })
+                self._session = session
+        return self._session
+
+    def request(self, method: str, path: str, json_body: Optional[dict] = None,
+                params: Optional[dict] = None, body: Optional[MultipartFileBody] = None,
+                name: Optional[str] = None, idempotent: bool = True) -> dict:
+        """
+        Notion APIにリクエストを送信し、レスポンスのJSONを返します。
+        429/5xx/通信エラーの場合は最大max_retries回まで再試行します。
+        idempotent=Falseの場合は、429と送信前の接続エラーの場合だけ再試行します。
+        所要時間・送信バイト数・再試行回数は「http <name>」のステージとして計測します。
+
+        例外:
+            200以外のステータスコードで再試行できない（または再試行し尽くした）場合は例外を投げます。
+        """
+        with metrics.span(f"http {name or method + ' ' + path}") as span:
+            if body is not None:
+                span.bytes = len(body)
+            return self._request_with_retries(method, path, json_body, params, body, span, idempotent)
+
+    def _request_with_retries(self, method: str, path: str, json_body: Optional[dict], params: Optional[dict],
+                              body: Optional[MultipartFileBody], span: Span, idempotent: bool = True) -> dict:
+        import requests
+        from urllib3.exceptions import NewConnectionError
+
+        session = self._get_session()
+        headers = {}
+        if body is not None:
+            headers["Content-Type"] = body.content_type
+
+        for attempt in range(self.max_retries + 1):
+            if body is not None:
+                body.seek(0)
+            self.rate_limiter.acquire()
+            backoff = min(NOTION_BACKOFF_MAX, NOTION_BACKOFF_BASE * 2 ** attempt) * random.uniform(0.5, 1)
+            try:
+                response = session.request(
+                    method, f"{self.base_url}{path}", json=json_body, params=params, data=body,
+                    headers=headers, timeout=self.timeout
+                )
+            except (requests.ConnectionError, requests.Timeout) as e:
+                error = f"{method} {path} failed: {e}"
+                # 接続できなかった（リクエストを送っていない）場合以外は、Notionで処理済みかもしれない
+                reason = getattr(e.args[0], "reason", None) if e.args else None
+                if not idempotent and not isinstance(e, requests.ConnectTimeout) \
+                        and not isinstance(reason, NewConnectionError):
+                    raise Exception(error)
+            else:
+                if response.status_code == 200:
+                    self.rate_limiter.on_success()
+                    return response.json()
+                error = f"{method} {path} failed with status code {response.status_code}: {response.text}"
+                if response.status_code == 429:
+                    # Retry-Afterの間はRateLimiterが全リクエストを止めるので、ここでは待たない
+                    self.rate_limiter.on_throttled(parse_retry_after(response.headers.get("Retry-After"), backoff))
+                    backoff = 0.0
+                elif response.status_code < 500 or not idempotent:
+                    raise Exception(error)
+
+            if attempt < self.max_retries:
+                log(f"⚠️ {error}（{attempt + 1}回目の再試行）", level="warning")
+                span.retries += 1
+                self.rate_limiter.on_retry(backoff)
+                time.sleep(backoff)
+
+        raise Exception(error)
+
+    def stats(self) -> RateLimiterStats:
+        return self.rate_limiter.snapshot()
+
+    def query_database(self, database_id: str, **query) -> dict:
+        return self.request("POST", f"/databases/{database_id}/query", json_body=query,
+                            name="databases.query")
+
+    def update_page(self, page_id: str, properties: dict) -> dict:
+        return self.request("PATCH", f"/pages/{page_id}", json_body={"properties": properties},
+                            name="pages.update")
+
+    def list_block_children(self, block_id: str, start_cursor: Optional[str] = None,
+                            page_size: int = 100) -> dict:
+        params = {"page_size": page_size}
+        if start_cursor:
+            params["start_cursor"] = start_cursor
+        return self.request("GET", f"/blocks/{block_id}/children", params=params,
+                            name="blocks.children.list")
+
+    def delete_block(self, block_id: str) -> dict:
+        return self.request("DELETE", f"/blocks/{block_id}", name="blocks.delete")
+
+    def append_block_children(self, block_id: str, children: list) -> dict:
+        return self.request("PATCH", f"/blocks/{block_id}/children", json_body={"children": children},
+                            name="blocks.children.append", idempotent=False)
+
+    def create_file_upload(self, payload: dict) -> dict:
+        return self.request("POST", "/file_uploads", json_body=payload, name="file_uploads.create",
+                            idempotent=False)
+
+    def send_file_upload(self, file_upload_id: str, body: MultipartFileBody) -> dict:
+        return self.request("POST", f"/file_uploads/{file_upload_id}/send", body=body,
+                            name="file_uploads.send")
+
+    def retrieve_file_upload(self, file_upload_id: str) -> dict:
+        return self.request("GET", f"/file_uploads/{file_upload_id}", name="file_uploads.retrieve")
+
+    def complete_file_upload(self, file_upload_id: str) -> dict:
+        return self.request("POST", f"/file_uploads/{file_upload_id}/complete",
+                            name="file_uploads.complete", idempotent=False)
+
+    def close(self) -> None:
+        if self._session is not None:
+            self._session.close()
+
+notion = NotionTransport(NOTION_TOKEN)
+
+# ======== Notion Transport End ================================================
+
+# ======== Run Journal Begin ===================================================
+class RunJournal:
+    """
+    アイテムごとの処理の進捗をSQLiteに記録するジャーナル。
+
+    main() の各ステップが完了するたびに記録し、ダウンロードしたファイルのパス、
+    ファイルアップロードのID、送信済みのマルチパートのパート番号も保存します。
+    スクリプトが途中で終了しても、次回の実行では未完了のステップから再開でき、
+    マルチパートアップロードは未送信のパートだけを送信します。スレッドセーフです。
+
+    引数:
+        path (str): SQLiteのデータベースファイルのパス。
+    """
+    # アイテムの処理ステップ（この順番で完了する）
+    STEPS = ["downloaded", "media_prepared", "content_deleted", "video_uploaded", "thumbnail_uploaded", "attached",
+             "processed"]
+
+    def __init__(self, path: str):
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS items (
+                page_id TEXT PRIMARY KEY,
+                url TEXT,
+                step TEXT,
+                video_title TEXT,
+                video_filepath TEXT,
+                thumbnail_filepath TEXT,
+                updated_at TEXT,
+                cache_key TEXT
+            );
+            CREATE TABLE IF NOT EXISTS file_uploads (
+                page_id TEXT,
+                filepath TEXT,
+                file_upload_id TEXT,
+                number_of_parts INTEGER,
+                status TEXT,
+                PRIMARY KEY (page_id, filepath)
+            );
+            CREATE TABLE IF NOT EXISTS upload_parts (
+                file_upload_id TEXT,
+                part_number INTEGER,
+                PRIMARY KEY (file_upload_id, part_number)
+            );
+            CREATE TABLE IF NOT EXISTS sync_state (
+                database_id TEXT PRIMARY KEY,
+                last_edited_time TEXT,
+                full_synced_at REAL
+            );
+        """)
+        # 以前のバージョンで作成したジャーナルには cache_key の列がないため追加する
+        columns = {row["name"] for row in self._conn.execute("PRAGMA table_info(items)")}
+        if "cache_key" not in columns:
+            self._conn.execute("ALTER TABLE items ADD COLUMN cache_key TEXT")
+
+    def _execute(self, sql: str, params: tuple = ()) -> list:
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def get_item(self, page_id: str) -> Optional[sqlite3.Row]:
+        rows = self._execute("SELECT * FROM items WHERE page_id = ?", (page_id,))
+        return rows[0] if rows else None
+
+    def is_done(self, page_id: str, step: str) -> bool:
+        """指定したステップまで完了しているかどうかを返します。"""
+        row = self.get_item(page_id)
+        if row is None or row["step"] not in self.STEPS:
+            return False
+        return self.STEPS.index(row["step"]) >= self.STEPS.index(step)
+
+    def record_step(self, page_id: str, step: str, url: Optional[str] = None,
+                    video_info: Optional[VideoInfo] = None) -> None:
+        """ステップの完了を記録します。video_infoを渡した場合はファイルのパスも保存します。"""
+        now = datetime.datetime.now().isoformat()
+        self._execute(
+            "INSERT INTO items (page_id, step, updated_at) VALUES (?, ?, ?) "
+            "ON CONFLICT(page_id) DO UPDATE SET step = excluded.step, updated_at = excluded.updated_at",
+            (page_id, step, now)
+        )
+        if url is not None:
+            self._execute("UPDATE items SET url = ? WHERE page_id = ?", (url, page_id))
+        if video_info is not None:
+            self._execute(
+                "UPDATE items SET video_title = ?, video_filepath = ?, thumbnail_filepath = ?, cache_key = ? "
+                "WHERE page_id = ?",
+                (video_info.video_title, video_info.video_filepath, video_info.thumbnail_filepath,
+                 video_info.cache_key, page_id)
+            )
+
+    def get_video_info(self, page_id: str) -> Optional[VideoInfo]:
+        row = self.get_item(page_id)
+        if row is None or row["video_filepath"] is None:
+            return None
+        return VideoInfo(
+            video_title=row["video_title"],
+            video_filepath=row["video_filepath"],
+            thumbnail_filepath=row["thumbnail_filepath"],
+            cache_key=row["cache_key"]
+        )
+
+    def get_file_upload(self, page_id: str, filepath: str) -> Optional[sqlite3.Row]:
+        rows = self._execute("SELECT * FROM file_uploads WHERE page_id = ? AND filepath = ?", (page_id, filepath))
+        return rows[0] if rows else None
+
+    def start_file_upload(self, page_id: str, filepath: str, file_upload_id: str, number_of_parts: int) -> None:
+        self.forget_file_upload(page_id, filepath)
+        self._execute(
+            "INSERT INTO file_uploads (page_id, filepath, file_upload_id, number_of_parts, status) "
+            "VALUES (?, ?, ?, ?, 'pending')",
+            (page_id, filepath, file_upload_id, number_of_parts)
+        )
+
+    def set_file_upload_status(self, page_id: str, filepath: str, status: str) -> None:
+        self._execute("UPDATE file_uploads SET status = ? WHERE page_id = ? AND filepath = ?",
+                      (status, page_id, filepath))
+
+    def forget_file_upload(self, page_id: str, filepath: str) -> None:
+        row = self.get_file_upload(page_id, filepath)
+        if row is not None:
+            self._execute("DELETE FROM upload_parts WHERE file_upload_id = ?", (row["file_upload_id"],))
+            self._execute("DELETE FROM file_uploads WHERE page_id = ? AND filepath = ?", (page_id, filepath))
+
+    def mark_part_sent(self, file_upload_id: str, part_number: int) -> None:
+        self._execute("INSERT OR IGNORE INTO upload_parts (file_upload_id, part_number) VALUES (?, ?)",
+                      (file_upload_id, part_number))
+
+    def sent_parts(self, file_upload_id: str) -> set:
+        rows = self._execute("SELECT part_number FROM upload_parts WHERE file_upload_id = ?", (file_upload_id,))
+        return {row["part_number"] for row in rows}
+
+    def start_item(self, page_id: str, url: str) -> None:
+        """
+        アイテムの処理を始める前に呼び出します。前回の処理が完了している場合（処理済みを外して
+        もう一度処理する場合）や、URLが変わっている場合は、記録を削除して最初から処理されるようにします。
+        """
+        row = self.get_item(page_id)
+        if row is None or (row["step"] != "processed" and row["url"] in (None, url)):
+            return
+        for file_upload in self._execute("SELECT filepath FROM file_uploads WHERE page_id = ?", (page_id,)):
+            self.forget_file_upload(page_id, file_upload["filepath"])
+        self._execute("DELETE FROM items WHERE page_id = ?", (page_id,))
+
+    def finish_item(self, page_id: str) -> None:
+        """アイテムの処理完了を記録し、不要になったファイルアップロードの記録を削除します。"""
+        self.record_step(page_id, "processed")
+        for row in self._execute("SELECT filepath FROM file_uploads WHERE page_id = ?", (page_id,)):
+            self.forget_file_upload(page_id, row["filepath"])
+
+    def get_sync_state(self, database_id: str) -> Optional[sqlite3.Row]:
+        """--watch で前回までに取得したアイテムのlast_edited_timeの最大値と、最後に全件を取得した時刻を返します。"""
+        rows = self._execute("SELECT * FROM sync_state WHERE database_id = ?", (database_id,))
+        return rows[0] if rows else None
+
+    def set_sync_state(self, database_id: str, last_edited_time: str, full_synced_at: Optional[float] = None) -> None:
+        self._execute(
+            "INSERT INTO sync_state (database_id, last_edited_time, full_synced_at) VALUES (?, ?, ?) "
+            "ON CONFLICT(database_id) DO UPDATE SET last_edited_time = excluded.last_edited_time, "
+            "full_synced_at = COALESCE(excluded.full_synced_at, sync_state.full_synced_at)",
+            (database_id, last_edited_time, full_synced_at)
+        )
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+journal = RunJournal(JOURNAL_PATH)
+
+# ======== Run Journal End =====================================================
+
+# ======== Download Cache Begin ================================================
+@dataclass
+class CacheStats:
+    """
+    ダウンロード・アップロードキャッシュの統計情報（今回の実行分）。
+
+    属性:
+        download_hits (int): ダウンロードをキャッシュで省略した回数。
+        download_misses (int): キャッシュになくダウンロードした回数。
+        upload_hits (int): 同じ内容のファイルアップロードを再利用した回数。
+        upload_misses (int): ファイルをNotionに送信した回数。
+        evictions (int): 容量の上限を超えたため削除したキャッシュの件数。
+        bytes_saved (int): キャッシュによって転送せずに済んだバイト数。
+    """
+    download_hits: int = 0
+    download_misses: int = 0
+    upload_hits: int = 0
+    upload_misses: int = 0
+    evictions: int = 0
+    bytes_saved: int = 0
+
+class DownloadCache:
+    """
+    ダウンロードしたファイルと、Notionに送信したファイルのキャッシュ。
+
+    ダウンロードは「抽出器:動画ID」をキーに記録するため、同じ動画であれば別の形式のURLからでも
+    ダウンロード済みのファイルをネットワークに接続せずに再利用します。
+    ダウンロードしたファイルは合計サイズがmax_bytesを超えないよう、最後に使ってから
+    最も時間が経ったものから削除します（処理中のアイテムのファイルは削除しません）。
+    アップロードはファイル内容のSHA-256をキーにfile_upload_idを記録し、同じ内容の再送信を省きます。
+    スレッドセーフです。
+
+    引数:
+        path (str): SQLiteのデータベースファイルのパス。
+        max_bytes (int): キャッシュするダウンロードファイルの合計サイズの上限。
+    """
+    def __init__(self, path: str, max_bytes: int = DOWNLOAD_CACHE_MAX_BYTES):
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.max_bytes = max_bytes
+        self.stats = CacheStats()
+        self._pinned = {}
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS downloads (
+                cache_key TEXT PRIMARY KEY,
+                video_title TEXT,
+                video_filepath TEXT,
+                thumbnail_filepath TEXT,
+                sha256 TEXT,
+                size INTEGER,
+                last_used REAL
+            );
+            CREATE TABLE IF NOT EXISTS uploads (
+                sha256 TEXT PRIMARY KEY,
+                file_upload_id TEXT,
+                created_at REAL
+            );
+        """)
+
+    def _execute(self, sql: str, params: tuple = ()) -> list:
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def _count(self, name: str, value: int = 1) -> None:
+        with self._lock:
+            setattr(self.stats, name, getattr(self.stats, name) + value)
+
+    def get(self, cache_key: str) -> Optional[VideoInfo]:
+        """キャッシュされたダウンロードを返します。ファイルが消えているか変更されていればNoneを返します。"""
+        rows = self._execute("SELECT * FROM downloads WHERE cache_key = ?", (cache_key,))
+        row = rows[0] if rows else None
+        if row is None or not os.path.exists(row["video_filepath"]) \
+                or os.path.getsize(row["video_filepath"]) != row["size"]:
+            if row is not None:
+                self._execute("DELETE FROM downloads WHERE cache_key = ?", (cache_key,))
+            self._count("download_misses")
+            return None
+
+        self._execute("UPDATE downloads SET last_used = ? WHERE cache_key = ?", (time.time(), cache_key))
+        self._pin(cache_key)
+        self._count("download_hits")
+        self._count("bytes_saved", row["size"])
+        return VideoInfo(
+            video_title=row["video_title"],
+            video_filepath=row["video_filepath"],
+            thumbnail_filepath=row["thumbnail_filepath"],
+            cache_key=cache_key
         )
-        return response.get("results", [])
-    
-    # 何かしらのエラーが発生した場合は空のリストを返す
+
+    def put(self, cache_key: str, video_info: VideoInfo) -> None:
+        """ダウンロードしたファイルを記録し、容量の上限を超えていれば古いものから削除します。"""
+        size = os.path.getsize(video_info.video_filepath)
+        self._execute(
+            "INSERT OR REPLACE INTO downloads "
+            "(cache_key, video_title, video_filepath, thumbnail_filepath, sha256, size, last_used) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (cache_key, video_info.video_title, video_info.video_filepath, video_info.thumbnail_filepath,
+             file_sha256(video_info.video_filepath), size, time.time())
+        )
+        self._pin(cache_key)
+        self._evict()
+
+    def update_files(self, cache_key: str, video_info: VideoInfo) -> None:
+        """アップロード前の変換で置き換わった動画とサムネイルのファイルを記録し直します。"""
+        self._execute(
+            "UPDATE downloads SET video_filepath = ?, thumbnail_filepath = ?, sha256 = ?, size = ? WHERE cache_key = ?",
+            (video_info.video_filepath, video_info.thumbnail_filepath, file_sha256(video_info.video_filepath),
+             os.path.getsize(video_info.video_filepath), cache_key)
+        )
+
+    def update_thumbnail(self, cache_key: str, thumbnail_filepath: str) -> None:
+        self._execute("UPDATE downloads SET thumbnail_filepath = ? WHERE cache_key = ?",
+                      (thumbnail_filepath, cache_key))
+
+    def release(self, cache_key: Optional[str]) -> None:
+        """処理が終わったアイテムのファイルを、削除の対象に戻します。"""
+        with self._lock:
+            if cache_key in self._pinned:
+                self._pinned[cache_key] -= 1
+                if self._pinned[cache_key] <= 0:
+                    del self._pinned[cache_key]
+
+    def discard(self, cache_key: Optional[str]) -> bool:
+        """
+        処理が終わったアイテムのファイルをキャッシュから外します（ファイルは呼び出し元が削除・移動します）。
+        ほかの処理中のアイテムも同じファイルを使っている場合は外さずにFalseを返します。
+        """
+        with self._lock:
+            self.release(cache_key)
+            if cache_key in self._pinned:
+                return False
+            if cache_key is not None:
+                self._execute("DELETE FROM downloads WHERE cache_key = ?", (cache_key,))
+            return True
+
+    def pin(self, cache_key: Optional[str]) -> None:
+        """前回の実行から再開するアイテムのファイルを、処理が終わるまで削除されないようにします（release()で解除）。"""
+        if cache_key is not None:
+            self._pin(cache_key)
+
+    def _pin(self, cache_key: str) -> None:
+        with self._lock:
+            self._pinned[cache_key] = self._pinned.get(cache_key, 0) + 1
+
+    def _evict(self) -> None:
+        with self._lock:
+            total = self._execute("SELECT COALESCE(SUM(size), 0) AS total FROM downloads")[0]["total"]
+            for row in self._execute("SELECT * FROM downloads ORDER BY last_used"):
+                if total <= self.max_bytes:
+                    break
+                if row["cache_key"] in self._pinned:
+                    continue
+                for filepath in (row["video_filepath"], row["thumbnail_filepath"]):
+                    if filepath and os.path.exists(filepath):
+                        os.remove(filepath)
+                self._execute("DELETE FROM downloads WHERE cache_key = ?", (row["cache_key"],))
+                total -= row["size"]
+                self._count("evictions")
+                log(f"キャッシュの上限を超えたため「{row['video_filepath']}」を削除しました。")
+
+    def count_upload(self, hit: bool, nbytes: int = 0) -> None:
+        self._count("upload_hits" if hit else "upload_misses")
+        self._count("bytes_saved", nbytes)
+
+    def get_file_upload(self, sha256: str) -> Optional[str]:
+        rows = self._execute("SELECT file_upload_id FROM uploads WHERE sha256 = ?", (sha256,))
+        return rows[0]["file_upload_id"] if rows else None
+
+    def put_file_upload(self, sha256: str, file_upload_id: str) -> None:
+        self._execute("INSERT OR REPLACE INTO uploads (sha256, file_upload_id, created_at) VALUES (?, ?, ?)",
+                      (sha256, file_upload_id, time.time()))
+
+    def forget_file_upload(self, sha256: str) -> None:
+        self._execute("DELETE FROM uploads WHERE sha256 = ?", (sha256,))
+
+    def snapshot(self) -> CacheStats:
+        with self._lock:
+            return CacheStats(**asdict(self.stats))
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+_sha256_memo = {}
+_sha256_memo_lock = threading.Lock()
+
+# ファイル内容のSHA-256を返す関数（同じファイルの再計算はしない）
+def file_sha256(filepath: str) -> str:
+    stat = os.stat(filepath)
+    memo_key = (os.path.abspath(filepath), stat.st_size, stat.st_mtime_ns)
+    with _sha256_memo_lock:
+        if memo_key in _sha256_memo:
+            return _sha256_memo[memo_key]
+
+    digest = hashlib.sha256()
+    with open(filepath, "rb") as f:
+        while block := f.read(1024 * 1024):
+            digest.update(block)
+    with _sha256_memo_lock:
+        _sha256_memo[memo_key] = digest.hexdigest()
+    return digest.hexdigest()
+
+# URLから、ネットワークに接続せずにキャッシュのキー（「抽出器:動画ID」）を求める関数
+def get_download_cache_key(url: str) -> Optional[str]:
+    from yt_dlp.extractor import gen_extractor_classes
+
+    for ie in gen_extractor_classes():
+        if ie.ie_key() == "Generic" or not ie.suitable(url):
+            continue
+        try:
+            video_id = ie.get_temp_id(url)
+        except Exception:
+            video_id = None
+        return f"{ie.ie_key()}:{video_id}" if video_id else None
+    return None
+
+download_cache = DownloadCache(CACHE_PATH)
+
+# ======== Download Cache End ==================================================
+
+# ======== Transfer Scheduler Begin ============================================
+@dataclass
+class DiskBudgetStats:
+    """disk_budgetの状態（確保中のバイト数、待機した回数と合計秒数）"""
+    reserved_bytes: int = 0
+    peak_reserved_bytes: int = 0
+    waits: int = 0
+    wait_seconds: float = 0.0
+
+class DiskBudget:
+    """
+    ダウンロード中・アップロード待ちのファイルが使うディスク容量を管理するクラス。
+
+    ダウンロードの前に、yt-dlpがメタデータから求めたファイルサイズを acquire() で確保し、
+    確保中の合計が max_bytes を超える場合や、ダウンロード先の空き容量が min_free_bytes を
+    下回る場合は、ほかのアイテムが release() するまで待機させます。
+    ほかに確保中のアイテムがなければ、max_bytes より大きいファイルでも受け入れます（待ち続けないように）。
+    スレッドセーフです。
+
+    引数:
+        max_bytes (int): 確保できる合計サイズの上限（0の場合は上限なし）。
+        min_free_bytes (int): ダウンロード先に残しておく空き容量。
+    """
+    # 空き容量は確保中のファイルの書き込みでも変わるため、待機中はこの間隔で確認し直す
+    RECHECK_SECONDS = 5.0
+
+    def __init__(self, max_bytes: int = DOWNLOAD_DISK_BUDGET_BYTES, min_free_bytes: int = DOWNLOAD_MIN_FREE_BYTES):
+        self.max_bytes = max_bytes
+        self.min_free_bytes = min_free_bytes
+        self.stats = DiskBudgetStats()
+        self._cond = threading.Condition()
+
+    def acquire(self, nbytes: int, directory: str) -> int:
+        """
+        nbytesを確保できるまで待機し、確保したバイト数を返します。
+        例外:
+            ほかに確保中のアイテムがないのに空き容量が足りない場合は例外を投げます。
+        """
+        os.makedirs(directory, exist_ok=True)
+        with self._cond:
+            started = None
+            while True:
+                over_budget = self.max_bytes and self.stats.reserved_bytes + nbytes > self.max_bytes
+                no_space = shutil.disk_usage(directory).free - nbytes < self.min_free_bytes
+                if not over_budget and not no_space:
+                    break
+                if self.stats.reserved_bytes == 0:
+                    if no_space:
+                        raise Exception(f"ディスクの空き容量が不足しています（必要: {nbytes / 1024 / 1024:.1f}MB）")
+                    break
+                if started is None:
+                    started = time.monotonic()
+                    self.stats.waits += 1
+                    log(f"▶ ディスクの使用量が上限に達しているため、{nbytes / 1024 / 1024:.1f}MBのダウンロードを待機します。")
+                self._cond.wait(self.RECHECK_SECONDS)
+            if started is not None:
+                self.stats.wait_seconds += time.monotonic() - started
+            self.stats.reserved_bytes += nbytes
+            self.stats.peak_reserved_bytes = max(self.stats.peak_reserved_bytes, self.stats.reserved_bytes)
+        return nbytes
+
+    def adjust(self, reserved: int, nbytes: int) -> int:
+        """確保済みのreservedバイトを、実際のサイズnbytesに置き換えます（待機はしません）。"""
+        with self._cond:
+            self.stats.reserved_bytes += nbytes - reserved
+            self.stats.peak_reserved_bytes = max(self.stats.peak_reserved_bytes, self.stats.reserved_bytes)
+            self._cond.notify_all()
+        return nbytes
+
+    def release(self, nbytes: int) -> None:
+        if nbytes <= 0:
+            return
+        with self._cond:
+            self.stats.reserved_bytes = max(0, self.stats.reserved_bytes - nbytes)
+            self._cond.notify_all()
+
+    def snapshot(self) -> DiskBudgetStats:
+        with self._cond:
+            return DiskBudgetStats(**asdict(self.stats))
+
+class BandwidthLimiter:
+    """
+    複数のスレッドの転送量の合計を、bytes_per_second以下に抑えるクラス。
+
+    転送したバイト数を consume() に渡すと、それまでの合計が上限を超えている分だけ待機します。
+    1秒分までのバーストは待たずに通します。bytes_per_secondが0の場合は何もしません。
+    """
+    BURST_SECONDS = 1.0
+
+    def __init__(self, bytes_per_second: float):
+        self.bytes_per_second = bytes_per_second
+        self._lock = threading.Lock()
+        self._next_free = time.monotonic()
+
+    def consume(self, nbytes: int) -> None:
+        if self.bytes_per_second <= 0 or nbytes <= 0:
+            return
+        with self._lock:
+            now = time.monotonic()
+            self._next_free = max(self._next_free, now) + nbytes / self.bytes_per_second
+            wait = self._next_free - now - self.BURST_SECONDS
+        if wait > 0:
+            time.sleep(wait)
+
+    def progress_hook(self) -> Callable[[dict], None]:
+        """yt-dlpのダウンロードの進捗から、前回からの増分を消費するprogress_hookを返します。"""
+        downloaded = {}
+
+        def hook(d: dict) -> None:
+            if d.get("status") != "downloading":
+                return
+            filename = d.get("tmpfilename") or d.get("filename")
+            total = d.get("downloaded_bytes") or 0
+            self.consume(total - downloaded.get(filename, 0))
+            downloaded[filename] = total
+
+        return hook
+
+# yt-dlpがメタデータから求めた、ダウンロードする形式の合計サイズ（不明な場合はNone）を返す関数
+def estimate_download_size(info: dict) -> Optional[int]:
+    total = 0
+    for fmt in info.get("requested_formats") or [info]:
+        size = fmt.get("filesize") or fmt.get("filesize_approx")
+        if not size:
+            return None
+        total += int(size)
+    return total
+
+disk_budget = DiskBudget()
+download_bandwidth = BandwidthLimiter(DOWNLOAD_BANDWIDTH_LIMIT)
+upload_bandwidth = BandwidthLimiter(UPLOAD_BANDWIDTH_LIMIT)
+
+# ======== Transfer Scheduler End ==============================================
+
+# ======== Source Policy Begin =================================================
+@dataclass
+class SourcePolicy:
+    """
+    ダウンロード元（URLのホスト）ごとの設定。
+
+    属性:
+        concurrent_fragments (int): 1つのダウンロード内で同時に取得するフラグメント数（yt-dlpの concurrent_fragment_downloads）。
+        max_concurrent_items (int): このホストから同時にダウンロードするアイテム数の上限（0の場合は上限なし）。
+        delete_content (bool): Notionのページコンテンツを削除してから添付するかどうか。
+    """
+    concurrent_fragments: int = DOWNLOAD_CONCURRENT_FRAGMENTS
+    max_concurrent_items: int = 0
+    delete_content: bool = True
+
+# ホスト（サブドメインを含む）ごとの設定。ここにないホストは SourcePolicy() の既定値を使う
+SOURCE_POLICIES = {
+    # Xからのダウンロードはコンテンツを削除しない。同時に取得するとレート制限されやすいため1件ずつ
+    "x.com": SourcePolicy(max_concurrent_items=1, delete_content=False),
+    "twitter.com": SourcePolicy(max_concurrent_items=1, delete_content=False),
+    "youtube.com": SourcePolicy(max_concurrent_items=2),
+    "youtu.be": SourcePolicy(max_concurrent_items=2),
+}
+
+# SOURCE_POLICIES_JSON で上書き・追加した設定の表を返す関数（JSONが不正な場合は警告して組み込みの表を使う）
+def load_source_policies(policies_json: str = SOURCE_POLICIES_JSON) -> dict[str, SourcePolicy]:
+    policies = dict(SOURCE_POLICIES)
+    if not policies_json:
+        return policies
+    try:
+        for host, settings in json.loads(policies_json).items():
+            policies[host] = SourcePolicy(**{**asdict(policies.get(host, SourcePolicy())), **settings})
+    except (json.JSONDecodeError, TypeError, AttributeError) as e:
+        log(f"⚠️ SOURCE_POLICIES_JSON の設定が正しくないため、組み込みのホストごとの設定を使います: {e}", level="warning")
+        return dict(SOURCE_POLICIES)
+    return policies
+
+SOURCE_POLICIES = load_source_policies()
+
+# URLのホストに対応する（設定の表のキー, 設定）を返す関数
+def get_source_policy(url: str) -> tuple[str, SourcePolicy]:
+    host = (urlparse(url).hostname or "").lower()
+    for key, policy in SOURCE_POLICIES.items():
+        if host == key or host.endswith("." + key):
+            return key, policy
+    return host, SourcePolicy()
+
+_source_semaphores = {}
+_source_semaphores_lock = threading.Lock()
+
+# ホストごとの同時ダウンロード数の上限まで、空きができるのを待ってから処理するコンテキストマネージャ
+@contextmanager
+def source_slot(url: str, item_id: Optional[str] = None) -> Iterator[SourcePolicy]:
+    key, policy = get_source_policy(url)
+    if policy.max_concurrent_items <= 0:
+        yield policy
+        return
+
+    with _source_semaphores_lock:
+        if key not in _source_semaphores:
+            _source_semaphores[key] = threading.BoundedSemaphore(policy.max_concurrent_items)
+        semaphore = _source_semaphores[key]
+    with metrics.span("wait_source_slot", item_id=item_id, host=key):
+        if not semaphore.acquire(blocking=False):
+            log(f"▶ 「{key}」からのダウンロードが同時に{policy.max_concurrent_items}件に達しているため、待機します。")
+            semaphore.acquire()
+    try:
+        yield policy
+    finally:
+        semaphore.release()
+
+# ======== Source Policy End ===================================================
+
+# ======== Media Preparation Begin =============================================
+# サムネイルの保存形式ごとの拡張子
+THUMBNAIL_EXTENSIONS = {"jpeg": ".jpg", "webp": ".webp", "png": ".png"}
+
+_media_pool = None
+_media_pool_lock = threading.Lock()
+
+# サムネイルの変換や動画の再エンコードを実行するプロセスプールを（まだであれば）作って返す関数
+def get_media_pool():
+    global _media_pool
+    with _media_pool_lock:
+        if _media_pool is None:
+            # 読み込みに時間がかかるため、メディアの変換を行うときに読み込む
+            import multiprocessing
+            from concurrent.futures import ProcessPoolExecutor
+            # スレッドを使っているプロセスをforkしないように、macOSの既定と同じspawnで起動する
+            _media_pool = ProcessPoolExecutor(max_workers=MEDIA_PREP_WORKERS,
+                                              mp_context=multiprocessing.get_context("spawn"))
+        return _media_pool
+
+# プロセスプールを作っていれば終了する関数
+def shutdown_media_pool() -> None:
+    global _media_pool
+    with _media_pool_lock:
+        if _media_pool is not None:
+            _media_pool.shutdown()
+            _media_pool = None
+
+# 関数をspawnで起動した子プロセスから参照できるかどうかを返す関数
+def is_picklable_job(function: Callable) -> bool:
+    """
+    子プロセスには関数がモジュール名で渡されます。スクリプトとして実行した場合（__main__）は子プロセスでも
+    同じファイルが読み込まれますが、ベンチマークや download-audee-mp3.py のようにimportlibで別名
+    （sample_notion_get_db）として読み込んだ場合は、子プロセスがそのモジュールをimportできません。
+    """
+    import importlib.util
+    module_name = function.__module__
+    if module_name == "__main__":
+        return True
+    try:
+        return importlib.util.find_spec(module_name) is not None
+    except (ImportError, ValueError):
+        return False
+
+_media_pool_unavailable_logged = False
+
+# 関数をプロセスプールで（MEDIA_PREP_WORKERSが0の場合や子プロセスから参照できない場合はこのプロセスで）実行して結果を返す関数
+def run_media_job(function: Callable, *args):
+    global _media_pool_unavailable_logged
+    if MEDIA_PREP_WORKERS <= 0:
+        return function(*args)
+    if not is_picklable_job(function):
+        if not _media_pool_unavailable_logged:
+            _media_pool_unavailable_logged = True
+            log(f"モジュール「{function.__module__}」は子プロセスから読み込めないため、ファイルの変換はこのプロセスで行います。")
+        return function(*args)
+    return get_media_pool().submit(function, *args).result()
+
+_pillow_available = None
+
+# Pillowが使えるかどうかを返す関数（使えない場合は最初の1回だけ警告する）
+def is_pillow_available() -> bool:
+    global _pillow_available
+    if _pillow_available is None:
+        import importlib.util
+        _pillow_available = importlib.util.find_spec("PIL") is not None
+        if not _pillow_available:
+            log("⚠️ Pillowがインストールされていないため、サムネイルの変換をスキップします。（pip install Pillow）", level="warning")
+    return _pillow_available
+
+# ダウンロードしたファイルのサイズから、アップロード前に動画を再エンコードするかどうかを返す関数
+def will_transcode(file_size: Optional[int]) -> bool:
+    return bool(VIDEO_TRANSCODE_MAX_BYTES > 0 and file_size and file_size > VIDEO_TRANSCODE_MAX_BYTES
+                and shutil.which(FFMPEG_PATH))
+
+# サムネイルを長辺max_size以下に縮小し、指定の形式で保存し直してファイルパスを返す関数（プロセスプールで実行）
+def normalize_thumbnail(filepath: str, max_size: int, image_format: str, quality: int) -> str:
+    """
+    すでに指定の形式で長辺がmax_size以下の場合や、変換してもファイルが小さくならない場合は
+    元のファイルをそのまま使います。変換した場合は拡張子を形式に合わせ、元のファイルは削除します。
+    """
+    from PIL import Image
+
+    output_filepath = os.path.splitext(filepath)[0] + THUMBNAIL_EXTENSIONS[image_format]
+    temp_filepath = output_filepath + ".tmp"
+    with Image.open(filepath) as image:
+        if (image.format or "").lower() == image_format and max(image.size) <= max_size:
+            return filepath
+        image.thumbnail((max_size, max_size))
+        if image_format == "jpeg" and image.mode not in ("RGB", "L"):
+            image = image.convert("RGB")
+        image.save(temp_filepath, format=image_format.upper(), quality=quality, optimize=True)
+
+    if os.path.getsize(temp_filepath) >= os.path.getsize(filepath) and \
+            os.path.splitext(filepath)[1].lower() in MIME_TYPES:
+        os.remove(temp_filepath)
+        return filepath
+    os.replace(temp_filepath, output_filepath)
+    if output_filepath != filepath:
+        os.remove(filepath)
+    return output_filepath
+
+# 動画をffmpegで指定のビットレートのmp4に再エンコードし、ファイルパスを返す関数（プロセスプールで実行）
+def transcode_video(filepath: str, ffmpeg: str, video_bitrate: str, audio_bitrate: str) -> str:
+    """
+    再エンコードしてもファイルが小さくならない場合は元のファイルをそのまま使います。
+    再エンコードした場合は元のファイルを置き換えます（拡張子は .mp4 になります）。
+    例外:
+        ffmpegが失敗した場合は、ffmpegのエラー出力の末尾を含めた例外を投げます。
+    """
+    root = os.path.splitext(filepath)[0]
+    output_filepath = root + ".mp4"
+    temp_filepath = root + ".transcoding.mp4"
+    result = subprocess.run([
+        ffmpeg, "-y", "-v", "error", "-i", filepath,
+        "-c:v", "libx264", "-b:v", video_bitrate, "-maxrate", video_bitrate,
+        "-c:a", "aac", "-b:a", audio_bitrate, "-movflags", "+faststart", temp_filepath
+    ], stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    if result.returncode != 0:
+        if os.path.exists(temp_filepath):
+            os.remove(temp_filepath)
+        raise Exception(f"ffmpegが終了コード{result.returncode}で失敗しました: {result.stderr.strip()[-500:]}")
+
+    if os.path.getsize(temp_filepath) >= os.path.getsize(filepath):
+        os.remove(temp_filepath)
+        return filepath
+    os.replace(temp_filepath, output_filepath)
+    if output_filepath != filepath:
+        os.remove(filepath)
+    return output_filepath
+
+# ======== Media Preparation End ===============================================
+
+# Notionデータベースから未処理のアイテムを1件ずつ返すジェネレータ
+def iter_items(database_id, page_size: int = NOTION_QUERY_PAGE_SIZE,
+               edited_since: Optional[str] = None, processed_property: str = "処理済") -> Iterator[dict]:
+    """
+    プロパティ「処理済」（processed_property）が未チェックのアイテムを、next_cursorを辿りながら1件ずつ返します。
+    あるページのアイテムを返している間に、次のページをバックグラウンドで先読みします。
+    保持するのは処理中のページと先読み中のページの最大2ページ分だけなので、
+    データベースの件数に関係なくメモリ使用量は一定です。
+
+    引数:
+        database_id (str): 対象のNotionデータベースのID。
+        page_size (int): 1回のクエリで取得する件数（最大100）。
+        edited_since (Optional[str]): 指定した場合は、last_edited_timeがこの時刻（ISO 8601）以降の
+            アイテムだけを、last_edited_timeの古い順に返します。
+        processed_property (str): 処理済みかどうかを表すチェックボックスプロパティの名前。
+    戻り値:
+        Iterator[dict]: Notionのページオブジェクト。
+    例外:
+        クエリに失敗した場合は、そのページに到達した時点で例外を投げます。
+    """
+    # プロパティ「処理済」が未チェックのアイテムを取得
+    item_filter = {
+        "property": processed_property,
+        "checkbox": {
+            "equals": False
+        }
+    }
+    sorts = None
+    if edited_since:
+        item_filter = {
+            "and": [
+                item_filter,
+                {
+                    "timestamp": "last_edited_time",
+                    "last_edited_time": {
+                        "on_or_after": edited_since
+                    }
+                }
+            ]
+        }
+        sorts = [{"timestamp": "last_edited_time", "direction": "ascending"}]
+
+    def fetch_page(start_cursor: Optional[str]) -> dict:
+        query = {
+            "database_id": database_id,
+            "filter": item_filter,
+            "page_size": page_size,
+        }
+        if sorts:
+            query["sorts"] = sorts
+        if start_cursor:
+            query["start_cursor"] = start_cursor
+        try:
+            return notion.query_database(**query)
+        except Exception as e:
+            raise Exception(f"Notionデータベースの取得に失敗しました: {e}")
+
+    with ThreadPoolExecutor(max_workers=1, thread_name_prefix="notion-query") as executor:
+        future = executor.submit(fetch_page, None)
+        while future is not None:
+            response = future.result()
+            # 次のページがあれば、このページを処理している間に先読みしておく
+            if response.get("has_more") and response.get("next_cursor"):
+                future = executor.submit(fetch_page, response["next_cursor"])
+            else:
+                future = None
+            yield from response.get("results", [])
+
+# 処理対象のデータベースの一覧を返す関数（NOTION_DATABASES_PATHが空の場合は NOTION_DATABASE_ID だけ）
+def load_database_configs(path: str = NOTION_DATABASES_PATH) -> list[DatabaseConfig]:
+    """
+    設定ファイルは、DatabaseConfigの属性を持つオブジェクトのJSON配列です。省略した属性は既定値になります。
+        [
+            {"name": "チームA", "database_id": "xxxx"},
+            {"name": "チームB", "database_id": "yyyy", "url_property": "リンク", "processed_property": "完了"}
+        ]
+    例外:
+        設定ファイルを読み込めない場合や、database_idのない項目がある場合は例外を投げます。
+    """
+    if not path:
+        return [DatabaseConfig()]
+    try:
+        with open(path, encoding="utf-8") as f:
+            databases = [DatabaseConfig(**entry) for entry in json.load(f)]
     except Exception as e:
-        raise Exception(f"Notionデータベースの取得に失敗しました: {e}")
+        raise Exception(f"データベースの設定ファイル「{path}」の読み込みに失敗しました: {e}")
+    for database in databases:
+        if not database.database_id:
+            raise Exception(f"データベースの設定ファイル「{path}」にdatabase_idのない項目があります: {database}")
+    return databases
+
+# 複数のデータベースを並行してクエリし、未処理のアイテムをデータベースごとに1件ずつ交互に返す関数
+def iter_database_items(databases: list[DatabaseConfig], edited_since: Optional[dict] = None,
+                        errors: Optional[dict] = None) -> Iterator[tuple[DatabaseConfig, dict]]:
+    """
+    データベースごとのスレッドが iter_items でアイテムを先読みし（1データベースあたり最大
+    NOTION_QUERY_PAGE_SIZE件と先読み中の1ページ）、取得できたデータベースから順番に1件ずつ返します。
+    件数の多いデータベースがあっても、ほかのデータベースのアイテムが後回しにならないようにするためです。
+    Notion APIの接続プールとレート制限は、すべてのデータベースで共有されます。
+
+    引数:
+        databases (list[DatabaseConfig]): 対象のデータベース。
+        edited_since (Optional[dict]): database_idごとの iter_items の edited_since。
+        errors (Optional[dict]): 渡した場合は、クエリに失敗したデータベースのdatabase_idと例外を記録します。
+    戻り値:
+        Iterator[tuple[DatabaseConfig, dict]]: (アイテムのデータベース, Notionのページオブジェクト)
+    """
+    edited_since = edited_since or {}
+    cond = threading.Condition()
+    buffers = [[] for _ in databases]
+    done = [False] * len(databases)
+    failures = [None] * len(databases)
+    stopped = False
+
+    def fetch(index: int) -> None:
+        database = databases[index]
+        try:
+            for item in iter_items(database.database_id, edited_since=edited_since.get(database.database_id),
+                                   processed_property=database.processed_property):
+                with cond:
+                    while len(buffers[index]) >= NOTION_QUERY_PAGE_SIZE and not stopped:
+                        cond.wait()
+                    if stopped:
+                        return
+                    buffers[index].append(item)
+                    cond.notify_all()
+        except Exception as e:
+            failures[index] = e
+        finally:
+            with cond:
+                done[index] = True
+                cond.notify_all()
+
+    for index, database in enumerate(databases):
+        threading.Thread(target=fetch, args=(index,), name=f"notion-query-{database.name}", daemon=True).start()
+
+    active = list(range(len(databases)))
+    try:
+        while active:
+            with cond:
+                while not any(buffers[index] or done[index] for index in active):
+                    cond.wait()
+            # 取得できているデータベースから1件ずつ順番に返す
+            for index in list(active):
+                with cond:
+                    if buffers[index]:
+                        item = buffers[index].pop(0)
+                        cond.notify_all()
+                    elif done[index]:
+                        active.remove(index)
+                        item = None
+                    else:
+                        continue
+                if item is None:
+                    if failures[index] is not None:
+                        log(f"❌ データベース「{databases[index].name}」の取得に失敗しました: {failures[index]}", level="error")
+                        if errors is not None:
+                            errors[databases[index].database_id] = failures[index]
+                    continue
+                yield databases[index], item
+    finally:
+        # 途中で読むのをやめた場合は、先読みしているスレッドを止める
+        with cond:
+            stopped = True
+            cond.notify_all()
 
 # アイテムのプロパティからURLを取得する関数
-def get_item_propertie_url(item) -> str:
+def get_item_propertie_url(item, property_name: str = "URL") -> str:
     # アイテムのプロパティからURLを取得
     try:
-        if 'URL' in item['properties']:
-            return item['properties']['URL']['url']
+        if property_name in item['properties']:
+            return item['properties'][property_name]['url']
         else:
             return None
     except Exception as e:
         raise Exception(f"アイテムのプロパティからURLを取得できませんでした: {e}")
 
+# yt-dlpのYoutubeDLを（まだであれば）読み込んで返す関数
+def load_youtube_dl():
+    global YoutubeDL
+    if YoutubeDL is None:
+        from yt_dlp import YoutubeDL
+    return YoutubeDL
+
 # 動画ファイル、サムネイルファイルをダウンロードして情報を返す関数
-def download_file(url: str, output_dir: str = "~/Downloads") -> VideoInfo:
+def download_file(url: str, output_dir: str = "~/Downloads",
+                  streaming_upload: Optional["StreamingUpload"] = None,
+                  before_download: Optional[Callable[[dict], None]] = None,
+                  concurrent_fragments: int = DOWNLOAD_CONCURRENT_FRAGMENTS) -> VideoInfo:
+    """
+    URLの動画とサムネイルをダウンロードします。
+    streaming_uploadを渡した場合、1ファイルで出力される形式であれば、ダウンロードしながら
+    完成した10MBのパートから順にNotionへ送信します（結合が必要な形式は通常どおりダウンロードのみ）。
+    before_downloadを渡した場合は、メタデータだけを取得した後、ダウンロードを始める前に
+    その情報（ダウンロードする形式とfilesize/filesize_approxを含む）を渡して呼び出します。
+    concurrent_fragmentsは、HLS/DASHなどのフラグメントに分かれた形式で同時に取得するフラグメント数です。
+    """
     outtmpl = f"{output_dir}/%(title)s_%(id)s.%(ext)s"
 
     ydl_opts = {
         "outtmpl": outtmpl,
         "writethumbnail": True,  # typo fixed from "writethiumbnail"
         "format": "bv[ext=mp4]+ba[ext=m4a]/bv+ba/best[ext=mp4]/best",
-        "age_limit": 1985
+        "age_limit": 1985,
+        "concurrent_fragment_downloads": max(1, concurrent_fragments),
     }
+    ydl_opts["progress_hooks"] = [download_bandwidth.progress_hook()]
+    if streaming_upload is not None:
+        ydl_opts["progress_hooks"].append(streaming_upload.progress_hook)
 
     try:
-        with YoutubeDL(ydl_opts) as ydl:
-            info = ydl.extract_info(url, download=True)
+        # 同じ動画をダウンロード済みであれば、ネットワークに接続せずにそのファイルを使う
+        cache_key = get_download_cache_key(url)
+        if cache_key:
+            cached = download_cache.get(cache_key)
+            if cached:
+                log(f"✅ URL「{url}」の動画はキャッシュ済みのため、ダウンロードをスキップします: {cached.video_filepath}")
+                return cached
+
+        with load_youtube_dl()(ydl_opts) as ydl:
+            # 先にメタデータだけを取得して、ダウンロードする形式とサイズを決めてからダウンロードする
+            info = ydl.extract_info(url, download=False)
+            if before_download is not None:
+                before_download(info)
+            if streaming_upload is not None:
+                # ストリーミングできる形式ならファイルアップロードを作成しておく
+                streaming_upload.prepare(info, ydl.prepare_filename(info))
+            try:
+                info = ydl.process_ie_result(info, download=True)
+            except Exception:
+                if streaming_upload is not None:
+                    streaming_upload.abort()
+                raise
             video_title = info.get("title")
             video_filepath = ydl.prepare_filename(info)
 
@@ -122,77 +1730,367 @@ def download_file(url: str, output_dir: str = "~/Downloads") -> VideoInfo:
                     thumbnail_filepath = thumb["filepath"]
                     break
 
-            return VideoInfo(
+            video_info = VideoInfo(
                 video_title=video_title,
                 video_filepath=video_filepath,
-                thumbnail_filepath=thumbnail_filepath
+                thumbnail_filepath=thumbnail_filepath,
+                # 次回の検索と同じ、URLから求めたキーで保存する（Xでは動画IDがツイートIDと異なるため、
+                # 情報から求めたキーは求められなかった場合だけ使う）
+                cache_key=cache_key or f"{info.get('extractor_key')}:{info.get('id')}"
             )
+            download_cache.put(video_info.cache_key, video_info)
+            return video_info
 
     except Exception as e:
         raise Exception(f"URL「{url}」の動画のダウンロードに失敗しました: {e}")
 
 # 指定したNotionページ内のすべての子ブロック（コンテンツ）を削除する関数
-def delete_page_content(page_id: str) -> bool:
+def delete_page_content(page_id: str, concurrency: int = DELETE_CONCURRENCY) -> int:
     """
     指定したNotionページ内のすべての子ブロック（コンテンツ）を削除します。
+    子ブロックはnext_cursorを辿ってすべて取得してから、最大concurrency件ずつ並行して削除します。
+    削除リクエストもNotionTransportのレート制限を通して送信されます。
     引数:
         page_id (str): コンテンツを削除するNotionページのID。
+        concurrency (int): 同時に削除するブロック数。
     戻り値:
-        bool: すべての子ブロックの削除に成功した場合はTrue、失敗した場合はFalse。
+        int: 削除した子ブロックの数。
     例外:
         削除処理中に例外が発生した場合はエラーメッセージを出力します。
     """
 
     try:
-        # 1. ページ内の子ブロックを取得
-        children = notion.blocks.children.list(block_id=page_id)["results"]
-
-        # 2. 各ブロックを削除
-        for block in children:
-            block_id = block["id"]
-            notion.blocks.delete(block_id)
-        
-        return True
+        started = time.monotonic()
+
+        # 1. ページ内の子ブロックをすべて取得（削除しながら辿るとカーソルがずれるため先に集める）
+        block_ids = []
+        start_cursor = None
+        while True:
+            response = notion.list_block_children(page_id, start_cursor=start_cursor)
+            block_ids.extend(block["id"] for block in response.get("results", []))
+            if not response.get("has_more") or not response.get("next_cursor"):
+                break
+            start_cursor = response["next_cursor"]
+
+        # 2. 各ブロックを並行して削除
+        with ThreadPoolExecutor(max_workers=max(1, concurrency), thread_name_prefix="delete-block") as executor:
+            futures = [executor.submit(notion.delete_block, block_id) for block_id in block_ids]
+            try:
+                for future in as_completed(futures):
+                    future.result()
+            except Exception:
+                for future in futures:
+                    future.cancel()
+                raise
+
+        log(f"ページID「{page_id}」の子ブロックを{len(block_ids)}件削除しました。（{time.monotonic() - started:.1f}秒）")
+        return len(block_ids)
 
     except Exception as e:
         raise Exception(f"ページID「 {page_id}」のコンテンツ削除に失敗しました: {e}")
 
-# 指定したNotionページのタイトルを変更する関数
-def change_page_title(page_id: str, new_title: str) -> bool:
+# マルチパートアップロードの1パートを送信する関数
+def upload_file_part(file_upload_id: str, source: Union[str, int], file_name: str, mime_type: str,
+                     part_number: int, number_of_parts: int, file_size: int, use_mmap: bool = True) -> None:
     """
-    指定したNotionページのタイトルを変更します。
-    引数:
-        page_id (str): タイトルを変更するNotionページのID。
-        new_title (str): 新しいタイトル。
-    戻り値:
-        bool: タイトルの変更に成功した場合はTrue、失敗した場合はFalse。
+    ファイル（パスまたはファイルディスクリプタ）のpart_number番目のパート（MULTIPART_CHUNK_SIZEごと）を
+    読み込み、Notionに送信します。
+    同じパート番号は送り直しても上書きされるだけなので、429/5xx/通信エラーはNotionTransportが
+    そのパートだけ再送します（4xxは再送しません）。
+
     例外:
-        タイトル変更中に例外が発生した場合はエラーメッセージを出力します。
+        再試行しても送信できなかった場合は例外を投げます。
+    """
+    offset = (part_number - 1) * MULTIPART_CHUNK_SIZE
+    length = min(MULTIPART_CHUNK_SIZE, file_size - offset)
+
+    # パートの範囲をmmapから直接送信する（10MBのbytesやmultipart全体のコピーは作らない）
+    with MultipartFileBody(source, offset, length, file_name, mime_type,
+                           fields={"part_number": part_number}, use_mmap=use_mmap, limiter=upload_bandwidth) as body:
+        log(f"Uploading part {part_number} of {number_of_parts}...")
+        try:
+            notion.send_file_upload(file_upload_id, body)
+        except Exception as e:
+            raise Exception(f"Failed to upload part {part_number}: {e}")
+        journal.mark_part_sent(file_upload_id, part_number)
+
+# マルチパートアップロードの全パートを並行して送信する関数
+def upload_file_parts(file_upload_id: str, filepath: str, file_name: str, mime_type: str,
+                      number_of_parts: int, parallelism: int = UPLOAD_PARALLELISM) -> None:
+    """
+    全パートを最大parallelism個ずつ並行して送信します。
+    ジャーナルに送信済みと記録されているパートは送信しません。
+    いずれかのパートが再試行しても失敗した場合は、未着手のパートを取り消して例外を投げます。
+    """
+    file_size = os.path.getsize(filepath)
+    sent_parts = journal.sent_parts(file_upload_id)
+    if sent_parts:
+        log(f"送信済みの{len(sent_parts)}パートをスキップし、残りのパートから再開します。")
+    with ThreadPoolExecutor(max_workers=max(1, parallelism), thread_name_prefix="upload-part") as executor:
+        futures = [
+            executor.submit(upload_file_part, file_upload_id, filepath, file_name, mime_type,
+                            part_number, number_of_parts, file_size)
+            for part_number in range(1, number_of_parts + 1)
+            if part_number not in sent_parts
+        ]
+        try:
+            for future in as_completed(futures):
+                future.result()
+        except Exception:
+            for future in futures:
+                future.cancel()
+            raise
+
+# ジャーナルに記録された、前回の実行で作成したファイルアップロードを再利用できるか確認する関数
+def resume_file_upload(page_id: str, filepath: str, number_of_parts: int) -> tuple[Optional[str], Optional[str]]:
+    """
+    ジャーナルに記録されたファイルアップロードのステータスをNotionに問い合わせ、
+    送信を再開できる（pending）か、送信済み（uploaded）であればそのIDとステータスを返します。
+    期限切れなどで再利用できない場合は記録を削除して (None, None) を返します。
     """
+    record = journal.get_file_upload(page_id, filepath)
+    if record is None:
+        return None, None
+    if record["number_of_parts"] == number_of_parts:
+        try:
+            status = notion.retrieve_file_upload(record["file_upload_id"]).get("status")
+        except Exception as e:
+            log(f"⚠️ 前回のファイルアップロードの状態を取得できませんでした: {e}", level="warning")
+            status = None
+        if status in ("pending", "uploaded"):
+            log(f"▶ 前回のファイルアップロード「{record['file_upload_id']}」（{status}）から再開します。")
+            return record["file_upload_id"], status
+    journal.forget_file_upload(page_id, filepath)
+    return None, None
+
+# yt-dlpがダウンロード中のファイルを、パートがそろうたびにNotionへ送信するクラス
+class StreamingUpload:
+    """
+    yt-dlpのダウンロードと並行して、ダウンロード中のファイルをマルチパートでNotionへ送信するクラス。
 
-    try:
-        # ページのプロパティを更新
-        notion.pages.update(
-            page_id=page_id,
-            properties={
-                "title": {
-                    "title": [
-                        {
-                            "text": {
-                                "content": new_title
-                            }
-                        }
-                    ]
+    prepare() でメタデータから対象かどうかを判定し、1ファイルで出力される形式（結合なし）で
+    ファイルサイズが正確に分かり、single_partの上限を超える場合だけファイルアップロードを作成します。
+    yt-dlpのprogress_hooksに progress_hook を登録すると、書き込み中の .part ファイルに
+    10MBのパートがそろうたびにそのパートを送信し、ダウンロード完了後に最後のパートと /complete を送ります。
+    送信済みのパートとファイルアップロードはジャーナルに記録されるため、途中で失敗しても
+    アップロードのステップで残りのパートから再開されます。
+
+    引数:
+        page_id (str): ファイルを添付するNotionページのID（ジャーナルの記録に使用）。
+        parallelism (int): 同時に送信するパート数。
+    """
+    def __init__(self, page_id: str, parallelism: int = UPLOAD_PARALLELISM):
+        self.page_id = page_id
+        self.parallelism = parallelism
+        self.enabled = False
+        self.file_upload_id = None
+        self._cond = threading.Condition()
+        self._fd = None
+        self._thread = None
+        self._finished = False
+        self._aborted = False
+        self._error = None
+
+    def prepare(self, info: dict, filepath: str) -> bool:
+        """メタデータからストリーミングできるか判定し、できる場合はファイルアップロードを作成します。"""
+        total = info.get("filesize")
+        if info.get("requested_formats"):
+            log("結合が必要な形式のため、ダウンロード完了後にアップロードします。")
+            return False
+        if info.get("protocol") not in ("http", "https") or not total or total <= SINGLE_PART_MAX_BYTES:
+            log("ファイルサイズが不明またはsingle_partのサイズのため、ダウンロード完了後にアップロードします。")
+            return False
+        if will_transcode(total):
+            log("アップロード前に再エンコードするため、ダウンロード完了後にアップロードします。")
+            return False
+
+        self.filepath = filepath
+        self.file_name = os.path.basename(filepath)
+        self.file_size = total
+        self.number_of_parts = (total + MULTIPART_CHUNK_SIZE - 1) // MULTIPART_CHUNK_SIZE
+        self.mime_type = get_mime_type_from_extension(filepath).mime_type
+        self.file_upload_id = notion.create_file_upload({
+            "filename": self.file_name,
+            "content_type": self.mime_type,
+            "mode": "multi_part",
+            "number_of_parts": self.number_of_parts
+        })["id"]
+        journal.start_file_upload(self.page_id, filepath, self.file_upload_id, self.number_of_parts)
+        self.enabled = True
+        log(f"▶ ダウンロードしながらNotionにアップロードします（{self.number_of_parts}パート、File upload ID: {self.file_upload_id}）")
+        return True
+
+    def progress_hook(self, d: dict) -> None:
+        if not self.enabled:
+            return
+        with self._cond:
+            if d["status"] == "downloading" and self._thread is None:
+                self._fd = os.open(d.get("tmpfilename") or d["filename"], os.O_RDONLY)
+                self._thread = threading.Thread(target=self._run, name="streaming-upload", daemon=True)
+                self._thread.start()
+            elif d["status"] == "finished":
+                self._finished = True
+            elif d["status"] == "error":
+                self._aborted = True
+            self._cond.notify_all()
+
+    def _wait_for_bytes(self, end: int) -> None:
+        # ファイルの実際のサイズがendに達するまで待つ（進捗の通知はバッファ分を含むため使わない）
+        with self._cond:
+            while os.fstat(self._fd).st_size < end:
+                if self._aborted:
+                    raise Exception("ダウンロードが中断されました")
+                if self._finished:
+                    raise Exception(f"ダウンロードしたファイルのサイズが想定（{self.file_size}バイト）と異なります")
+                self._cond.wait(timeout=1)
+
+    def _run(self) -> None:
+        try:
+            with ThreadPoolExecutor(max_workers=max(1, self.parallelism), thread_name_prefix="streaming-part") as executor:
+                futures = []
+                for part_number in range(1, self.number_of_parts + 1):
+                    self._wait_for_bytes(min(part_number * MULTIPART_CHUNK_SIZE, self.file_size))
+                    futures.append(executor.submit(
+                        upload_file_part, self.file_upload_id, self._fd, self.file_name, self.mime_type,
+                        part_number, self.number_of_parts, self.file_size, use_mmap=False
+                    ))
+                for future in as_completed(futures):
+                    future.result()
+            notion.complete_file_upload(self.file_upload_id)
+            journal.set_file_upload_status(self.page_id, self.filepath, "uploaded")
+        except Exception as e:
+            self._error = e
+
+    def abort(self) -> None:
+        with self._cond:
+            self._aborted = True
+            self._cond.notify_all()
+        self.wait()
+
+    def wait(self) -> bool:
+        """
+        ダウンロード完了後に呼び出し、送信の完了を待ちます。
+        すべてのパートと /complete の送信に成功した場合はTrueを返します。
+        Falseの場合は、アップロードのステップで通常どおり（送信済みのパートを除いて）アップロードします。
+        """
+        if not self.enabled:
+            return False
+        with self._cond:
+            self._finished = True
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join()
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+        if self._thread is None:
+            # yt-dlpがダウンロード済みのファイルを見つけた場合など、ダウンロードが行われなかった
+            return False
+        if self._error is not None:
+            log(f"⚠️ ダウンロード中のアップロードを完了できませんでした。アップロード時に再開します: {self._error}", level="warning")
+            return False
+        log(f"✅ ダウンロードと並行して「{self.file_name}」の送信が完了しました。")
+        return True
+
+# 1ページ分のNotionへの書き込みをまとめて、できるだけ少ないAPI呼び出しで送信するクラス
+class PageWriteBatch:
+    """
+    1つのNotionページへの書き込み（プロパティの変更と、末尾へのブロックの追加）を溜めておき、
+    flush() でブロックの追加1回とプロパティの更新1回にまとめて送信するクラス。
+
+    ブロックの追加を先に送信し、成功した場合だけプロパティを更新するため、
+    「処理済」などのプロパティは添付が成功するまで変更されません。
+    Notion APIのレート制限の下では、1アイテムあたりのリクエスト数がそのまま処理速度になります。
+
+    引数:
+        page_id (str): 書き込み先のNotionページのID。
+    """
+    def __init__(self, page_id: str):
+        self.page_id = page_id
+        self.properties = {}
+        self.children = []
+        # 送信済みのファイルアップロードを再利用したブロックの、ファイル内容のハッシュ
+        self._reused_hashes = []
+
+    def set_title(self, new_title: str, property_name: str = "title") -> None:
+        self.properties[property_name] = {
+            "title": [
+                {
+                    "text": {
+                        "content": new_title
+                    }
+                }
+            ]
+        }
+
+    def set_checkbox(self, property_name: str, status: bool) -> None:
+        self.properties[property_name] = {
+            "checkbox": status
+        }
+
+    def attach_file(self, file_upload_id: str, file_name: str, file_type: str,
+                    reused_hash: Optional[str] = None) -> None:
+        """アップロード済みのファイルをページの末尾に追加するブロックを溜めます。file_typeによってdataが変わります。"""
+        self.children.append({
+            "type": file_type,
+            file_type: {
+                "caption": [
+                    {
+                        "type": "text",
+                        "text": {
+                            "content": file_name,
+                            "link": None
+                        },
+                        "annotations": {
+                            "bold": False,
+                            "italic": False,
+                            "strikethrough": False,
+                            "underline": False,
+                            "code": False,
+                            "color": "default"
+                        },
+                        "plain_text": file_name,
+                        "href": "null"
+                    }
+                ],
+                "type": "file_upload",
+                "file_upload": {
+                    "id": file_upload_id
                 }
             }
-        )
-        return True
+        })
+        if reused_hash is not None:
+            self._reused_hashes.append(reused_hash)
 
-    except Exception as e:
-        raise Exception(f"ページID「{page_id}」のタイトル変更に失敗しました: {e}")
+    def flush_children(self) -> None:
+        """溜めたブロックを1回のリクエストでページの末尾に追加します。"""
+        if not self.children:
+            return
+        try:
+            notion.append_block_children(self.page_id, self.children)
+        except Exception:
+            # 再利用したファイルアップロードが添付できなかった可能性があるため、次回は送信し直す
+            for content_hash in self._reused_hashes:
+                download_cache.forget_file_upload(content_hash)
+            raise
+        self.children = []
+        self._reused_hashes = []
+
+    def flush_properties(self) -> None:
+        """溜めたプロパティの変更を1回のリクエストで送信します。"""
+        if not self.properties:
+            return
+        notion.update_page(self.page_id, self.properties)
+        self.properties = {}
+
+    def flush(self) -> None:
+        """ブロックの追加、プロパティの更新の順に送信します。ブロックの追加に失敗した場合はプロパティを変更しません。"""
+        self.flush_children()
+        self.flush_properties()
 
 # 指定したNotionページの末尾にファイルをアップロードする関数
-def upload_file_to_notion(page_id: str, filepath: str) -> None:
+def upload_file_to_notion(page_id: str, filepath: str, parallelism: int = UPLOAD_PARALLELISM,
+                          batch: Optional[PageWriteBatch] = None) -> None:
     """
     指定したファイルをNotionにアップロードし、指定ページの末尾に添付します。
     この関数はNotion API仕様に従い、20MB以下はsingle_part、20MB超はmulti_partでアップロードします。
@@ -201,13 +2099,16 @@ def upload_file_to_notion(page_id: str, filepath: str) -> None:
     引数:
         page_id (str): ファイルを添付するNotionページのID。
         filepath (str): アップロードするファイルのパス。
+        parallelism (int): multi_partの場合に同時に送信するパート数。
+        batch (Optional[PageWriteBatch]): 渡した場合は添付をすぐには送信せず、このバッチに溜めます
+            （ほかのファイルと1回のリクエストで添付するため）。省略時はすぐに添付します。
 
     例外:
         いずれかの処理で失敗した場合は例外を投げます（詳細なエラーメッセージ付き）。
 
     備考:
-        - グローバル変数 NOTION_TOKEN, NOTION_VERSION を利用します。
-        - 補助関数 get_mime_type_from_extension(filepath) を利用し、MIMEタイプとファイルタイプを取得します。
+        - Notion APIへのリクエストはすべてグローバル変数 notion（NotionTransport）経由で送信します。
+        - 補助関数 get_mime_type(filepath) を利用し、ファイルの内容（分からない場合は拡張子）からMIMEタイプとファイルタイプを取得します。
         - 進捗やエラーは log 関数で出力します。
         - Notion APIのエンドポイントやペイロードは現行APIバージョンに準拠してください。
     """
@@ -215,20 +2116,42 @@ def upload_file_to_notion(page_id: str, filepath: str) -> None:
         # 20MB 以下なら single_part、20MB 超なら multi_part とする（Notion APIの仕様）
         file_size = os.path.getsize(filepath)
         file_name = os.path.basename(filepath)
-        mode = "single_part" if file_size <= 20 * 1024 * 1024 else "multi_part"
-        CHUNK_SIZE = 10 * 1024 * 1024  # 10MB
+        mode = "single_part" if file_size <= SINGLE_PART_MAX_BYTES else "multi_part"
 
-        mime_type_info = get_mime_type_from_extension(filepath)
+        mime_type_info = get_mime_type(filepath)
         payload = {}
 
+        write_batch = batch or PageWriteBatch(page_id)
+
+        # 同じ内容のファイルを送信済みで、まだ添付できる状態であれば、そのファイルアップロードを添付する
+        content_hash = file_sha256(filepath)
+        cached_file_upload_id = download_cache.get_file_upload(content_hash)
+        if cached_file_upload_id:
+            try:
+                status = notion.retrieve_file_upload(cached_file_upload_id).get("status")
+            except Exception as e:
+                status = f"取得できませんでした: {e}"
+            if status == "uploaded":
+                write_batch.attach_file(cached_file_upload_id, file_name, mime_type_info.file_type,
+                                        reused_hash=content_hash)
+                if batch is None:
+                    write_batch.flush()
+                download_cache.count_upload(hit=True, nbytes=file_size)
+                log(f"✅ ファイル「{file_name}」は送信済みのファイルアップロードを再利用しました。")
+                return
+            log(f"⚠️ 送信済みのファイルアップロードを再利用できませんでした（ステータス: {status}）", level="warning")
+            download_cache.forget_file_upload(content_hash)
+        download_cache.count_upload(hit=False)
+
         # Step 1: Create a File Upload object
+        number_of_parts = 1
         if mode == "single_part":
             payload ={
                 "filename": file_name,
             }
         elif mode == "multi_part":
             # 10MBごとの分割数を計算
-            number_of_parts = (file_size + CHUNK_SIZE - 1) // CHUNK_SIZE
+            number_of_parts = (file_size + MULTIPART_CHUNK_SIZE - 1) // MULTIPART_CHUNK_SIZE
             payload = {
                 "filename": file_name,
                 "content_type": mime_type_info.mime_type,
@@ -236,138 +2159,39 @@ def upload_file_to_notion(page_id: str, filepath: str) -> None:
                 "number_of_parts": number_of_parts
             }
 
-        file_create_response = requests.post("https://api.notion.com/v1/file_uploads",
-                                             json=payload,
-                                             headers={
-            "Authorization": f"Bearer {NOTION_TOKEN}",
-            "accept": "application/json",
-            "content-type": "application/json",
-            "Notion-Version": NOTION_VERSION
-        })
-
-        if file_create_response.status_code != 200:
-            raise Exception(
-                f"File creation failed with status code {file_create_response.status_code}: {file_create_response.text}"
-            )
-        
-        file_upload_id = json.loads(file_create_response.text)['id']
+        # 前回の実行で作成したファイルアップロードが残っていれば再利用する
+        file_upload_id, status = resume_file_upload(page_id, filepath, number_of_parts)
+        if file_upload_id is None:
+            file_upload_id = notion.create_file_upload(payload)['id']
+            journal.start_file_upload(page_id, filepath, file_upload_id, number_of_parts)
+            status = "pending"
         log(f"File upload ID: {file_upload_id}")
 
         # Step 2: Upload file contents
-        if mode == "single_part":
-            with open(filepath, "rb") as f:
-                # Provide the MIME content type of the file as the 3rd argument.
-                files = {
-                    "file": (file_name, f, mime_type_info.mime_type)
-                }
-
-                response = requests.post(
-                    f"https://api.notion.com/v1/file_uploads/{file_upload_id}/send",
-                    headers={
-                        "Authorization": f"Bearer {NOTION_TOKEN}",
-                        "Notion-Version": NOTION_VERSION
-                    },
-                    files=files
-                )
-
-                if response.status_code != 200:
-                    raise Exception(
-                        f"File upload failed with status code {response.status_code}: {response.text}")
+        if status == "uploaded":
+            log(f"ファイル「{file_name}」は前回の実行でアップロード済みのため、送信をスキップします。")
+
+        elif mode == "single_part":
+            # ファイル全体をmmapから直接送信する
+            with MultipartFileBody(filepath, 0, file_size, file_name, mime_type_info.mime_type,
+                                   limiter=upload_bandwidth) as body:
+                notion.send_file_upload(file_upload_id, body)
         
         elif mode == "multi_part":
-            url = f"https://api.notion.com/v1/file_uploads/{file_upload_id}/send"
-            headers = {
-                "Authorization": f"Bearer {NOTION_TOKEN}",
-                "Notion-Version": NOTION_VERSION
-            }
-            with open(filepath, "rb") as f:
-                # チャンクサイズごとにファイルを読み込む
-                for part_number in range(1, number_of_parts+1):
-                    chunk = f.read(CHUNK_SIZE)
-                    if not chunk:
-                        break
-
-                    files = {
-                        # Provide the MIME content type of the file
-                        # as the 3rd argument.
-                        "file": (file_name, chunk, mime_type_info.mime_type),
-                        # Use a file name of `None` to treat this as a regular
-                        # form field and not a file.
-                        "part_number": (None, str(part_number))
-                    }
-                    log(f"Uploading part {part_number} of {number_of_parts}...")
-
-                    # ファイルのチャンクをアップロード
-                    response = requests.post(url, headers=headers, files=files)
-
-                    if response.status_code != 200:
-                        raise Exception(f"Failed to upload part {part_number}: {response.status_code} - {response.text}")
+            # 各パートを並行してアップロードし、失敗したパートはそのパートだけ再送する
+            upload_file_parts(file_upload_id, filepath, file_name, mime_type_info.mime_type,
+                              number_of_parts, parallelism)
 
             # 全チャンクのアップロードが成功した場合は、完了通知を送信
-            url = f"https://api.notion.com/v1/file_uploads/{file_upload_id}/complete"
-            headers = {
-                "accept": "application/json",
-                "Authorization": f"Bearer {NOTION_TOKEN}",
-                "Notion-Version": NOTION_VERSION
-            }
-            response = requests.post(url, headers=headers)
+            notion.complete_file_upload(file_upload_id)
 
-            if response.status_code != 200:
-                raise Exception(
-                    f"Failed to complete file upload with status code {response.status_code}: {response.text}"
-                )
+        journal.set_file_upload_status(page_id, filepath, "uploaded")
+        download_cache.put_file_upload(content_hash, file_upload_id)
 
         # Step 3: Attach the file to a page or block
-
-        url = f"https://api.notion.com/v1/blocks/{page_id}/children"
-
-        headers = {
-            "Authorization": f"Bearer {NOTION_TOKEN}",
-            "Content-Type": "application/json",
-            "Notion-Version": NOTION_VERSION
-        }
-
-        # MIMEタイプによってdataが変わる
-        data = {
-            "children": [
-                {
-                    "type": mime_type_info.file_type,
-                    mime_type_info.file_type: {
-                        "caption": [
-                            {
-                                "type": "text",
-                                "text": {
-                                    "content": file_name,
-                                    "link": None
-                                },
-                                "annotations": {
-                                    "bold": False,
-                                    "italic": False,
-                                    "strikethrough": False,
-                                    "underline": False,
-                                    "code": False,
-                                    "color": "default"
-                                },
-                                "plain_text": file_name,
-                                "href": "null"
-                            }
-                        ],
-                        "type": "file_upload",
-                        "file_upload": {
-                            "id": file_upload_id
-                        }
-                    }
-                }
-            ]
-        }
-
-        # ページの末尾にファイルを添付する
-        response = requests.patch(url, headers=headers, data=json.dumps(data))
-
-        if response.status_code != 200:
-            raise Exception(
-                f"Failed to attach file to page with status code {response.status_code}: {response.text}"
-            )
+        write_batch.attach_file(file_upload_id, file_name, mime_type_info.file_type)
+        if batch is None:
+            write_batch.flush()
 
     except Exception as e:
         raise Exception(f"Notionへのアップロードに失敗しました: {e}")
@@ -383,123 +2207,597 @@ def rename_image2jpg_extension(filepath: str) -> str:
     """
     if filepath.endswith(".image"):
         new_filepath = filepath[:-6] + ".jpg"
+        # 前回の実行ですでに名称変更済みの場合はそのまま返す
+        if not os.path.exists(filepath) and os.path.exists(new_filepath):
+            return new_filepath
         os.rename(filepath, new_filepath)
         # log(f"✅ 拡張子が「.image」だったのでファイル名を変更しました: {filepath} -> {new_filepath}")
         return new_filepath
     return filepath
 
+# 拡張子ごとのMIMEタイプ
+MIME_TYPES = {
+    ".mp4": MimeTypeInfo(mime_type="application/mp4", file_type="video"),
+    ".mov": MimeTypeInfo(mime_type="video/quicktime", file_type="video"),
+    ".webm": MimeTypeInfo(mime_type="video/webm", file_type="video"),
+    ".jpg": MimeTypeInfo(mime_type="image/jpeg", file_type="image"),
+    ".jpeg": MimeTypeInfo(mime_type="image/jpeg", file_type="image"),
+    ".png": MimeTypeInfo(mime_type="image/png", file_type="image"),
+    ".gif": MimeTypeInfo(mime_type="image/gif", file_type="image"),
+    ".webp": MimeTypeInfo(mime_type="image/webp", file_type="image"),
+    ".avif": MimeTypeInfo(mime_type="image/avif", file_type="image"),
+    ".heic": MimeTypeInfo(mime_type="image/heic", file_type="image"),
+    ".m4a": MimeTypeInfo(mime_type="audio/mp4", file_type="audio"),
+}
+
+# ISO-BMFF（ftyp）のメジャーブランドごとの拡張子（動画だけでなく、画像や音声にも同じコンテナが使われる）
+FTYP_BRAND_EXTENSIONS = {
+    b"qt  ": ".mov",
+    **dict.fromkeys([b"isom", b"iso2", b"iso4", b"iso5", b"iso6", b"mp41", b"mp42", b"avc1", b"dash",
+                     b"M4V ", b"M4VP", b"mmp4"], ".mp4"),
+    **dict.fromkeys([b"avif", b"avis"], ".avif"),
+    **dict.fromkeys([b"heic", b"heix", b"mif1"], ".heic"),
+    b"M4A ": ".m4a",
+}
+
 # ファイルパスを渡して拡張子からMIMEタイプを返す関数
 def get_mime_type_from_extension(filepath: str) -> MimeTypeInfo:
     extension = os.path.splitext(filepath)[1].lower()
-    mime_types = {
-        ".mp4": MimeTypeInfo(mime_type="application/mp4", file_type="video"),
-        ".jpg": MimeTypeInfo(mime_type="image/jpeg", file_type="image"),
-        ".jpeg": MimeTypeInfo(mime_type="image/jpeg", file_type="image"),
-        ".png": MimeTypeInfo(mime_type="image/png", file_type="image"),
-        ".gif": MimeTypeInfo(mime_type="image/gif", file_type="image"),
-        ".webp": MimeTypeInfo(mime_type="image/webp", file_type="image"),
-    }
-    return mime_types.get(extension, MimeTypeInfo(mime_type="application/octet-stream", file_type="image"))
+    return MIME_TYPES.get(extension, MimeTypeInfo(mime_type="application/octet-stream", file_type="image"))
+
+# ファイルの先頭のバイト列（マジックナンバー）から、実際の形式の拡張子を返す関数（分からない場合はNone）
+def sniff_extension(filepath: str) -> Optional[str]:
+    with open(filepath, "rb") as f:
+        head = f.read(64)
+    if head.startswith(b"\xff\xd8\xff"):
+        return ".jpg"
+    if head.startswith(b"\x89PNG\r\n\x1a\n"):
+        return ".png"
+    if head.startswith((b"GIF87a", b"GIF89a")):
+        return ".gif"
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return ".webp"
+    if head[4:8] == b"ftyp":
+        # 知らないブランドは動画とみなさない
+        return FTYP_BRAND_EXTENSIONS.get(head[8:12])
+    if head.startswith(b"\x1a\x45\xdf\xa3") and b"webm" in head:
+        return ".webm"
+    return None
+
+# ファイルパスを渡して、ファイルの内容（分からない場合は拡張子）からMIMEタイプを返す関数
+def get_mime_type(filepath: str) -> MimeTypeInfo:
+    extension = sniff_extension(filepath)
+    if extension is not None:
+        return MIME_TYPES[extension]
+    return get_mime_type_from_extension(filepath)
+
+# ファイルの拡張子が実際の形式と異なる場合（.image の場合を含む）に、形式に合った拡張子に名称変更する関数
+def fix_file_extension(filepath: str) -> str:
+    """
+    Notionは添付するファイルの種類をファイル名の拡張子で判断するため、WebPなのに .jpg になっている
+    サムネイルなどを実際の形式に合わせます。形式が分からない場合は rename_image2jpg_extension と同じく
+    .image だけを .jpg に変更します。
+    戻り値:
+        str: 名称変更した（または変更の必要がなかった）ファイルパス。
+    """
+    if not os.path.exists(filepath):
+        return rename_image2jpg_extension(filepath)
+    extension = sniff_extension(filepath)
+    current = os.path.splitext(filepath)[1].lower()
+    if extension is None:
+        return rename_image2jpg_extension(filepath)
+    if current == extension or MIME_TYPES.get(current) == MIME_TYPES[extension]:
+        return filepath
+    new_filepath = os.path.splitext(filepath)[0] + extension
+    os.rename(filepath, new_filepath)
+    log(f"✅ ファイルの形式に合わせて拡張子を変更しました: {filepath} -> {new_filepath}")
+    return new_filepath
+
+# 動画とサムネイルのファイルの合計サイズを返す関数
+def get_files_size(video_info: VideoInfo) -> int:
+    return sum(os.path.getsize(filepath) for filepath in (video_info.video_filepath, video_info.thumbnail_filepath)
+               if filepath and os.path.exists(filepath))
+
+# Notionへの添付が完了したファイルを、POST_UPLOAD_ACTIONに従って削除・移動する関数
+def dispose_downloaded_files(video_info: VideoInfo, action: str = POST_UPLOAD_ACTION,
+                             archive_dir: str = ARCHIVE_DIR) -> None:
+    """
+    delete の場合は削除、archive の場合は archive_dir へ移動し、ダウンロードキャッシュからも外します。
+    cache の場合はファイルを残し、キャッシュの容量の上限に従って古いものから削除されるようにします。
+    同じファイルをほかの処理中のアイテムも使っている場合は、最後のアイテムが処理します。
+    """
+    if action == "cache":
+        download_cache.release(video_info.cache_key)
+        return
+    if not download_cache.discard(video_info.cache_key):
+        return
 
-# Notionのページのプロパティ「処理済」を操作する関数
-def change_item_processed_status(
-        item_id: str, property_name: str = "処理済", status: bool = True) -> bool:
+    for filepath in (video_info.video_filepath, video_info.thumbnail_filepath):
+        if not filepath or not os.path.exists(filepath):
+            continue
+        if action == "archive":
+            os.makedirs(archive_dir, exist_ok=True)
+            shutil.move(filepath, os.path.join(archive_dir, os.path.basename(filepath)))
+        else:
+            os.remove(filepath)
+    log(f"✅ アップロードが完了したファイル「{video_info.video_filepath}」を"
+        f"{'移動' if action == 'archive' else '削除'}しました。")
+
+# ======== Pipeline Begin ======================================================
+# アイテムからURLを取り出して処理対象のタスクを作る関数
+def create_item_task(database: DatabaseConfig, item: dict) -> Optional[ItemTask]:
+    log(f"▶ データベース「{database.name}」のアイテムID「{item['id']}」の処理を開始します。")
+    url = get_item_propertie_url(item, database.url_property)
+
+    if url is None:
+        log(f"⚠️ アイテム {item['id']} に「{database.url_property}」プロパティがありません。", level="warning")
+        return None
+    log(f"▶ アイテムID「{item['id']}」のURL: {url}")
+    # 前回の実行の記録が、処理済みのものやほかのURLのものであれば使わない
+    journal.start_item(item["id"], url)
+    return ItemTask(item=item, url=url, database=database)
+
+# ステップ1: URLから動画とサムネイルをダウンロードする
+def step_download(task: ItemTask) -> ItemTask:
+    # 前回の実行でダウンロード済みで、ファイルが残っていれば再利用する
+    video_info = journal.get_video_info(task.item_id)
+    if journal.is_done(task.item_id, "downloaded") and video_info and os.path.exists(video_info.video_filepath):
+        task.video_info = video_info
+        # アップロードが終わるまでキャッシュから削除されないようにし、ディスク容量の確保にも含める
+        download_cache.pin(video_info.cache_key)
+        task.reserved_bytes = disk_budget.adjust(0, get_files_size(video_info))
+        log(f"✅ URL「{task.url}」は前回の実行でダウンロード済みです: {video_info.video_filepath}")
+        return task
+
+    output_dir = os.path.expanduser("~/Downloads")
+
+    # ダウンロードする前に、メタデータのファイルサイズ分のディスク容量を確保する（足りなければ待機する）
+    def reserve_disk(info: dict) -> None:
+        nbytes = estimate_download_size(info) or DOWNLOAD_UNKNOWN_SIZE_BYTES
+        with metrics.span("wait_disk_budget", item_id=task.item_id) as span:
+            span.bytes = nbytes
+            task.reserved_bytes = disk_budget.acquire(nbytes, output_dir)
+
+    # ホストごとの同時ダウンロード数の上限に空きができるまで待ってからダウンロードする
+    with source_slot(task.url, task.item_id) as policy:
+        log(f"▶ URL「{task.url}」の動画をダウンロード中...")
+        with metrics.span("download", item_id=task.item_id) as span:
+            streaming_upload = StreamingUpload(task.item_id) if STREAMING_UPLOAD else None
+            task.video_info = download_file(task.url, output_dir, streaming_upload=streaming_upload,
+                                            before_download=reserve_disk,
+                                            concurrent_fragments=policy.concurrent_fragments)
+            if streaming_upload is not None:
+                streaming_upload.wait()
+            span.bytes = os.path.getsize(task.video_info.video_filepath)
+    # 見積もりと実際のサイズの差を反映する
+    if task.reserved_bytes:
+        task.reserved_bytes = disk_budget.adjust(task.reserved_bytes, get_files_size(task.video_info))
+    log(f"ダウンロードした動画のタイトル: {task.video_info.video_title}")
+    log(f"ダウンロードした動画のファイルパス: {task.video_info.video_filepath}")
+    log(f"ダウンロードしたサムネイルのファイルパス: {task.video_info.thumbnail_filepath}")
+    journal.record_step(task.item_id, "downloaded", url=task.url, video_info=task.video_info)
+    log(f"✅ URL「{task.url}」のダウンロードが完了しました。")
+    return task
+
+# ステップ2: アップロードするファイルを小さくする（サムネイルの縮小・変換、大きな動画の再エンコード）
+def step_prepare_media(task: ItemTask) -> ItemTask:
+    video_info = task.video_info
+    if journal.is_done(task.item_id, "media_prepared"):
+        log(f"✅ アイテムID「{task.item_id}」のファイルは前回の実行で変換済みです。")
+        return task
+
+    with metrics.span("prepare_media", item_id=task.item_id) as span:
+        before = get_files_size(video_info)
+        if video_info.thumbnail_filepath:
+            video_info.thumbnail_filepath = fix_file_extension(video_info.thumbnail_filepath)
+            if THUMBNAIL_MAX_SIZE > 0 and is_pillow_available():
+                log(f"▶ サムネイル「{video_info.thumbnail_filepath}」を長辺{THUMBNAIL_MAX_SIZE}px以下の{THUMBNAIL_FORMAT}に変換中...")
+                try:
+                    video_info.thumbnail_filepath = run_media_job(
+                        normalize_thumbnail, video_info.thumbnail_filepath, THUMBNAIL_MAX_SIZE,
+                        THUMBNAIL_FORMAT, THUMBNAIL_QUALITY
+                    )
+                except Exception as e:
+                    log(f"⚠️ サムネイルを変換できなかったため、元のファイルをアップロードします: {e}", level="warning")
+
+        if will_transcode(os.path.getsize(video_info.video_filepath)):
+            log(f"▶ 動画「{video_info.video_filepath}」を{VIDEO_TRANSCODE_VIDEO_BITRATE}bpsに再エンコード中...")
+            try:
+                video_info.video_filepath = run_media_job(
+                    transcode_video, video_info.video_filepath, shutil.which(FFMPEG_PATH),
+                    VIDEO_TRANSCODE_VIDEO_BITRATE, VIDEO_TRANSCODE_AUDIO_BITRATE
+                )
+            except Exception as e:
+                log(f"⚠️ 動画を再エンコードできなかったため、元のファイルをアップロードします: {e}", level="warning")
+        span.bytes = before
+        saved = before - get_files_size(video_info)
+
+    journal.record_step(task.item_id, "media_prepared", video_info=video_info)
+    if video_info.cache_key:
+        download_cache.update_files(video_info.cache_key, video_info)
+    if task.reserved_bytes:
+        task.reserved_bytes = disk_budget.adjust(task.reserved_bytes, get_files_size(video_info))
+    if saved > 0:
+        log(f"✅ アップロードするファイルを{saved / 1024 / 1024:.1f}MB小さくしました。")
+    return task
+
+# ステップ3: Notionのページ内容を削除する（タイトルはステップ4で「処理済」と一緒に変更する）
+def step_update_page(task: ItemTask) -> ItemTask:
+    source, policy = get_source_policy(task.url)
+    if journal.is_done(task.item_id, "content_deleted"):
+        log(f"✅ アイテムID「{task.item_id}」のページコンテンツは前回の実行で削除済みです。")
+    # Xからのダウンロードなど、SOURCE_POLICIESでdelete_contentがFalseのホストはコンテンツを削除しないようにする
+    elif not policy.delete_content:
+        log(f"⚠️ URL「{task.url}」は「{source}」からのダウンロードのため、コンテンツを削除しません。")
+    else:
+        log(f"▶ アイテムID「{task.item_id}」のページコンテンツを削除中...")
+        with metrics.span("delete_content", item_id=task.item_id):
+            delete_page_content(task.item_id)
+        log(f"✅ アイテムID「{task.item_id}」のページコンテンツを削除しました。")
+    # end if
+    if not journal.is_done(task.item_id, "content_deleted"):
+        journal.record_step(task.item_id, "content_deleted")
+    return task
+
+# ステップ4: 動画とサムネイルをアップロードして添付し、タイトルの変更と「処理済」をまとめて送信する
+def step_upload(task: ItemTask) -> ItemTask:
+    video_info = task.video_info
+    # 動画とサムネイルの添付は1回、タイトルと「処理済」の変更も1回のリクエストにまとめる
+    batch = PageWriteBatch(task.item_id)
+
+    if not journal.is_done(task.item_id, "attached"):
+        # 送信済みのファイルは、ジャーナルやキャッシュのファイルアップロードを添付に使う（送信はスキップされる）
+        log(f"▶ ファイル「{video_info.video_filepath}」の動画をNotionにアップロード中...")
+        with metrics.span("upload_video", item_id=task.item_id) as span:
+            span.bytes = os.path.getsize(video_info.video_filepath)
+            upload_file_to_notion(task.item_id, video_info.video_filepath, batch=batch)
+        journal.record_step(task.item_id, "video_uploaded")
+        log(f"✅ ファイル「{video_info.video_filepath}」の動画のアップロードが完了しました。")
+
+        # サムネイルの拡張子が.imageなら.jpgに変更
+        log(f"▶ ファイル「{video_info.thumbnail_filepath}」のサムネイルの拡張子を確認中...")
+        video_info.thumbnail_filepath = rename_image2jpg_extension(video_info.thumbnail_filepath)
+        journal.record_step(task.item_id, "video_uploaded", video_info=video_info)
+        if video_info.cache_key:
+            download_cache.update_thumbnail(video_info.cache_key, video_info.thumbnail_filepath)
+        log(f"✅ ファイル「{video_info.thumbnail_filepath}」のサムネイルの拡張子を確認・変更しました。")
+
+        # 動画の次に画像が並ぶように添付する
+        log(f"▶ アイテムID「{task.item_id}」のサムネイルをNotionにアップロード中...")
+        with metrics.span("upload_thumbnail", item_id=task.item_id) as span:
+            span.bytes = os.path.getsize(video_info.thumbnail_filepath)
+            upload_file_to_notion(task.item_id, video_info.thumbnail_filepath, batch=batch)
+        journal.record_step(task.item_id, "thumbnail_uploaded")
+        log(f"✅ アイテムID「{task.item_id}」のサムネイルのアップロードが完了しました。")
+
+        log(f"▶ アイテムID「{task.item_id}」に動画とサムネイルを添付中...")
+        with metrics.span("attach_files", item_id=task.item_id):
+            batch.flush_children()
+        journal.record_step(task.item_id, "attached")
+        log(f"✅ アイテムID「{task.item_id}」に動画とサムネイルを添付しました。")
+
+    # 添付に成功した後で、ページタイトルとプロパティ「処理済」をまとめて更新する
+    log(f"▶ アイテムID「{task.item_id}」のタイトルと「処理済」ステータスを更新中...")
+    batch.set_title(video_info.video_title, task.database.title_property)
+    batch.set_checkbox(task.database.processed_property, True)
+    with metrics.span("update_properties", item_id=task.item_id):
+        batch.flush_properties()
+    journal.finish_item(task.item_id)
+    log(f"✅ ページタイトルを「{video_info.video_title}」に変更し、「処理済」ステータスを更新しました。")
+
+    # 添付が完了したファイルを削除（または移動）し、確保していたディスク容量を返す
+    dispose_downloaded_files(video_info)
+    disk_budget.release(task.reserved_bytes)
+    task.reserved_bytes = 0
+
+    log(f"✅ アイテムID {task.item_id} の処理が完了しました。")
+    return task
+
+# 処理ステップ（ステージ名, 関数）。アイテムごとにこの順番で実行される
+PIPELINE_STEPS: list[tuple[str, Callable[[ItemTask], ItemTask]]] = [
+    ("download", step_download),
+    ("prepare", step_prepare_media),
+    ("notion", step_update_page),
+    ("upload", step_upload),
+]
+
+# アイテムの処理の終了時に、所要時間を「item」ステージとして記録し、確保していたディスク容量などを返す関数
+def finish_item_task(task: ItemTask, ok: bool) -> None:
+    seconds = time.perf_counter() - task.started
+    metrics.record(Span(stage="item", started=task.started, seconds=seconds, ok=ok), item_id=task.item_id)
+    if not ok:
+        # 失敗したアイテムのファイルは次回の再開のために残し、キャッシュの削除対象に戻す
+        if task.video_info is not None:
+            download_cache.release(task.video_info.cache_key)
+        disk_budget.release(task.reserved_bytes)
+        task.reserved_bytes = 0
+
+# アイテムを1件ずつ、すべてのステップを順番に処理する関数
+def process_items_sequential(items: Iterable[tuple[DatabaseConfig, dict]]) -> tuple[int, int]:
     """
-    アイテムのプロパティ「処理済」を更新する関数。
+    アイテムを1件ずつ順番に処理します。
+    あるアイテムで失敗しても、ログを出力して次のアイテムの処理を続けます。
 
-    Args:
-        item_id (str): 更新するアイテムのID。
-        status (bool): 新しいステータス（True: 処理済, False: 未処理）。
+    戻り値:
+        tuple[int, int]: (成功件数, 失敗件数)
+    """
+    succeeded, failed = 0, 0
+    for database, item in items:
+        task = create_item_task(database, item)
+        if task is None:
+            continue
+        try:
+            for _, step in PIPELINE_STEPS:
+                task = step(task)
+            finish_item_task(task, ok=True)
+            succeeded += 1
+        except Exception as e:
+            log(f"❌ アイテムID「{task.item_id}」の処理に失敗しました: {e}", level="error")
+            finish_item_task(task, ok=False)
+            failed += 1
+    return succeeded, failed
+
+# ステージごとのワーカープールをキューでつないでアイテムを並行処理する関数
+def process_items_pipeline(items: Iterable[tuple[DatabaseConfig, dict]], workers: int) -> tuple[int, int]:
+    """
+    ダウンロード、ファイルの変換、Notionのページ更新、アップロードの各ステージを、
+    それぞれworkers個のスレッドで構成されるワーカープールで実行します。
+    ステージ間は上限付きのキューでつながっているため、後段が詰まると前段も待機します。
+    各アイテムのステップはPIPELINE_STEPSの順番どおりに実行され、
+    あるアイテムの失敗はそのアイテムだけに留まります（後続ステージには流れません）。
+
+    引数:
+        items (Iterable[tuple[DatabaseConfig, dict]]): 処理対象の(データベース, Notionのページオブジェクト)。
+            複数のデータベースのアイテムも、同じワーカープールで処理します。
+        workers (int): 各ステージのワーカー数。
+    戻り値:
+        tuple[int, int]: (成功件数, 失敗件数)
     """
+    stop = object()
+    queues = [queue.Queue(maxsize=workers) for _ in PIPELINE_STEPS]
+    counts = {"succeeded": 0, "failed": 0}
+    counts_lock = threading.Lock()
+
+    def count(key: str) -> None:
+        with counts_lock:
+            counts[key] += 1
+
+    def worker(index: int) -> None:
+        stage_name, step = PIPELINE_STEPS[index]
+        is_last = index == len(PIPELINE_STEPS) - 1
+        while True:
+            task = queues[index].get()
+            if task is stop:
+                return
+            try:
+                task = step(task)
+            except Exception as e:
+                log(f"❌ アイテムID「{task.item_id}」の{stage_name}ステージで失敗しました: {e}", level="error")
+                finish_item_task(task, ok=False)
+                count("failed")
+                continue
+            if is_last:
+                finish_item_task(task, ok=True)
+                count("succeeded")
+            else:
+                queues[index + 1].put(task)
+
+    stages = []
+    for index, (stage_name, _) in enumerate(PIPELINE_STEPS):
+        threads = [
+            threading.Thread(target=worker, args=(index,), name=f"{stage_name}-{n}", daemon=True)
+            for n in range(workers)
+        ]
+        for thread in threads:
+            thread.start()
+        stages.append(threads)
+
     try:
-        notion.pages.update(
-            page_id=item_id,
-            properties={
-                property_name: {
-                    "checkbox": status
-                }
-            }
-        )
-        return True
-    
-    except Exception as e:
-        raise Exception(f"アイテムID「 {item_id}」の「{property_name}」ステータス更新に失敗: {e}")
+        # 先頭のステージにアイテムを投入する（キューが満杯の間はここで待機する）
+        for database, item in items:
+            task = create_item_task(database, item)
+            if task is not None:
+                queues[0].put(task)
+    finally:
+        # アイテムの取得中に例外やCtrl+Cが発生しても、投入済みのアイテムをアップロードの途中で
+        # 放り出さないよう、前のステージのワーカーがすべて終わってから次のステージに停止を伝える
+        for index, threads in enumerate(stages):
+            for _ in threads:
+                queues[index].put(stop)
+            for thread in threads:
+                thread.join()
+
+    return counts["succeeded"], counts["failed"]
+
+# ワーカー数に応じて、アイテムを順番に、またはパイプラインで処理する関数
+def process_items(items: Iterable[tuple[DatabaseConfig, dict]], workers: int) -> tuple[int, int]:
+    if workers > 0:
+        log(f"▶ 各ステージ{workers}ワーカーのパイプラインで処理します。")
+        return process_items_pipeline(items, workers)
+    return process_items_sequential(items)
+
+# ======== Pipeline End ========================================================
+
+# ======== Watch Begin =========================================================
+# ISO 8601の時刻（Notionのlast_edited_timeと同じ形式）を返す関数
+def format_notion_time(timestamp: float) -> str:
+    return datetime.datetime.fromtimestamp(timestamp, datetime.timezone.utc).strftime("%Y-%m-%dT%H:%M:00.000Z")
+
+# データベースをポーリングし続け、前回から変更されたアイテムだけを取得して処理する関数
+def watch_databases(databases: list[DatabaseConfig], workers: int, stop_event: threading.Event) -> int:
+    """
+    stop_eventがセットされるまで、データベースのポーリングと処理を繰り返します（--watch）。
+
+    各ポーリングでは、ジャーナルに保存したハイウォーターマーク（前回のポーリングの開始の1分前）以降に
+    変更されたアイテムだけを取得するため、毎回全件をクエリしません。プロセス、接続プール、
+    読み込み済みのモジュールはポーリングの間も保持されます。
+    アイテムがない間はポーリング間隔を WATCH_POLL_MIN_SECONDS から WATCH_POLL_MAX_SECONDS まで倍々に延ばし、
+    アイテムが見つかったら最小値に戻します。
+    WATCH_FULL_SYNC_SECONDS ごと（と初回）に未処理のアイテムを全件取得し、失敗したアイテムを再試行します。
+    ハイウォーターマークと全件取得の時刻はデータベースごとにジャーナルに保存するため、再起動しても引き継がれます。
+    複数のデータベースは iter_database_items で並行してクエリし、交互に処理します。
+    実行レポートはアイテムがあったポーリングごとに出力し、計測結果はポーリングごとにリセットします。
+
+    戻り値:
+        int: 処理したアイテムの件数。
+    """
+    interval = WATCH_POLL_MIN_SECONDS
+    # データベースごとの、前回の全件取得以降に取得したアイテムの(ID, last_edited_time, URL)。重なって取得されても
+    # 再処理しないが、URLを後から入力したり、アイテムを編集したりすれば、次のポーリングで処理し直す
+    # （last_edited_timeは分単位に丸められるため、同じ分のうちにURLを入力しても変わらないことがある）
+    seen = {database.database_id: set() for database in databases}
+    processed = 0
+
+    while not stop_event.is_set():
+        polled_at = time.time()
+        edited_since, full_synced = {}, set()
+        for database in databases:
+            state = journal.get_sync_state(database.database_id)
+            if state is None or state["full_synced_at"] is None \
+                    or polled_at - state["full_synced_at"] >= WATCH_FULL_SYNC_SECONDS:
+                full_synced.add(database.database_id)
+                seen[database.database_id].clear()
+            else:
+                edited_since[database.database_id] = state["last_edited_time"]
+        # last_edited_timeは分単位に丸められ、クエリへの反映にも遅れがあるため、次回はポーリングの開始の
+        # 1分前からさかのぼって取得する（取得したアイテムのlast_edited_timeまで進めると、反映の遅れたアイテムを取りこぼす）
+        high_water_mark = format_notion_time(polled_at - 60)
+        errors = {}
+
+        # このポーリングで処理を始めたアイテム（失敗したものは処理後にseenから外す）
+        started = []
+
+        def unseen_items() -> Iterator[tuple[DatabaseConfig, dict]]:
+            for database, item in iter_database_items(databases, edited_since=edited_since, errors=errors):
+                url = get_item_propertie_url(item, database.url_property)
+                key = (item["id"], item.get("last_edited_time"), url)
+                if key in seen[database.database_id]:
+                    continue
+                seen[database.database_id].add(key)
+                if url is not None:
+                    started.append((database.database_id, key))
+                yield database, item
+
+        found = False
+        try:
+            items = unseen_items()
+            first_item = next(items, None)
+            if first_item is not None:
+                found = True
+                succeeded, failed = process_items(itertools.chain([first_item], items), workers)
+                processed += succeeded + failed
+                log(f"ポーリングしたアイテムの処理が完了しました。（成功: {succeeded}件、失敗: {failed}件）")
+                write_run_report()
+            # 失敗したアイテムは、次のポーリングで取得されれば（編集された場合など）再試行する
+            for database_id, key in started:
+                if not journal.is_done(key[0], "processed"):
+                    seen[database_id].discard(key)
+            # 取得に失敗したデータベースは、次回も同じ時刻から取得し直す
+            for database in databases:
+                if database.database_id not in errors:
+                    journal.set_sync_state(
+                        database.database_id, max(edited_since.get(database.database_id, ""), high_water_mark),
+                        full_synced_at=polled_at if database.database_id in full_synced else None
+                    )
+        except Exception as e:
+            log(f"❌ データベースのポーリングに失敗しました: {e}", level="error")
+
+        except KeyboardInterrupt:
+            log("⚠️ 中断されました。", level="warning")
+            break
+        finally:
+            # 計測結果を溜め続けないよう、ポーリングごとにリセットする（アイテムがあった場合はレポートを出力済み）
+            metrics.reset()
+
+        interval = WATCH_POLL_MIN_SECONDS if found else min(interval * 2, WATCH_POLL_MAX_SECONDS)
+        if not found:
+            log(f"対象のアイテムがありません。{interval:.0f}秒後に再確認します。")
+        try:
+            stop_event.wait(interval)
+        except KeyboardInterrupt:
+            break
+
+    return processed
+
+# ======== Watch End ===========================================================
 
 # ======== Entry Point =========================================================
+# コマンドライン引数を解析する関数
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Notionデータベースの未処理アイテムの動画をダウンロードしてNotionに添付します。")
+    parser.add_argument(
+        "--workers", type=int, default=PIPELINE_WORKERS,
+        help="ダウンロード・ファイルの変換・Notion更新・アップロードの各ステージのワーカー数。0の場合は1件ずつ順番に処理します。"
+    )
+    parser.add_argument(
+        "--watch", action="store_true",
+        help="終了せずにデータベースをポーリングし続け、変更されたアイテムを処理します（Ctrl+CまたはSIGTERMで終了）。"
+    )
+    return parser.parse_args()
+
+# 計測結果とNotion API・キャッシュ・ディスクの統計を実行レポートとして出力する関数
+def write_run_report() -> None:
+    report_path = metrics.write_report(
+        METRICS_REPORT_DIR, notion_api=asdict(notion.stats()), cache=asdict(download_cache.snapshot()),
+        disk_budget=asdict(disk_budget.snapshot())
+    )
+    if report_path:
+        log(f"実行レポートを出力しました: {report_path}")
+
 def main() -> None:
+    args = parse_args()
+    has_work = False
     try:
         log("===== スクリプトを開始します。")
-        # データベースからアイテムを取得
-        items = get_items(NOTION_DATABASE_ID)
+        databases = load_database_configs()
+        if len(databases) > 1:
+            log(f"▶ {len(databases)}個のデータベースを処理します: {', '.join(database.name for database in databases)}")
+        if args.watch:
+            stop_event = threading.Event()
+            signal.signal(signal.SIGTERM, lambda signum, frame: stop_event.set())
+            log(f"▶ データベースの監視を開始します。（{WATCH_POLL_MIN_SECONDS:.0f}〜{WATCH_POLL_MAX_SECONDS:.0f}秒間隔）")
+            # 実行レポートはポーリングごとに出力済み
+            watch_databases(databases, args.workers, stop_event)
+            log("データベースの監視を終了しました。")
+            return
+
+        # データベースからアイテムを取得（すべてのデータベースを並行して先読みし、交互に処理する）
+        items = iter_database_items(databases)
+        first_item = next(items, None)
 
-        if not items:
+        if first_item is None:
             log("⚠️Notionデータベースに対象のアイテムがありません。", level="warning")
             return
 
-        for item in items:
-            # アイテムのプロパティからURLを取得
-            log(f"▶ アイテムID「{item['id']}」の処理を開始します。")
-            url = get_item_propertie_url(item)
+        has_work = True
+        succeeded, failed = process_items(itertools.chain([first_item], items), args.workers)
 
-            if url is None:
-                log(f"⚠️ アイテム {item['id']} に「URL」プロパティがありません。", level="warning")
-                continue
-            log(f"▶ アイテムID「{item['id']}」のURL: {url}")
-
-            # URLからファイルをダウンロード
-            log(f"▶ URL「{url}」の動画をダウンロード中...")
-            video_info: VideoInfo = download_file(url)
-            log(f"ダウンロードした動画のタイトル: {video_info.video_title}")
-            log(f"ダウンロードした動画のファイルパス: {video_info.video_filepath}")
-            log(f"ダウンロードしたサムネイルのファイルパス: {video_info.thumbnail_filepath}")
-            log(f"✅ URL「{url}」のダウンロードが完了しました。")
-
-            # ダウンロードが完了したらNotionのページ内のコンテンツを削除
-            # Xからのダウンロードはコンテンツを削除しないようにする
-            if url.startswith("https://x.com/"):
-                log(f"⚠️ URL「{url}」はXからのダウンロードのため、コンテンツを削除しません。")
-            else:
-                log(f"▶ アイテムID「{item['id']}」のページコンテンツを削除中...")
-                delete_page_content(item["id"])
-                log(f"✅ アイテムID「{item['id']}」のページコンテンツを削除しました。")
-            # end if
-
-            # ダウンロードが完了したらNotionのページタイトルを動画のタイトルに変更
-            log(f"▶ ページタイトルを変更中...")
-            change_page_title(item["id"], video_info.video_title)
-            log(f"✅ ページタイトルを「{video_info.video_title}」に変更しました。")
-
-            # ファイルがダウンロードできたら、Notionに動画をアップロード
-            log(f"▶ ファイル「{video_info.video_filepath}」の動画をNotionにアップロード中...")
-            upload_file_to_notion(item["id"], video_info.video_filepath)
-            log(f"✅ ファイル「{video_info.video_filepath}」の動画のアップロードが完了しました。")
-
-            # サムネイルの拡張子が.imageなら.jpgに変更
-            log(f"▶ ファイル「{video_info.thumbnail_filepath}」のサムネイルの拡張子を確認中...")
-            video_info.thumbnail_filepath = rename_image2jpg_extension(video_info.thumbnail_filepath)
-            log(f"✅ ファイル「{video_info.thumbnail_filepath}」のサムネイルの拡張子を確認・変更しました。")
-
-            # 動画のアップロードの次に画像を添付する
-            log(f"▶ アイテムID「{item['id']}」のサムネイルをNotionにアップロード中...")
-            upload_file_to_notion(item["id"], video_info.thumbnail_filepath)
-            log(f"✅ アイテムID「{item['id']}」のサムネイルのアップロードが完了しました。")
-
-            # アイテムのプロパティ「処理済」をチェックにする
-            log(f"▶ アイテムID「{item['id']}」の「処理済」ステータスを更新中...")
-            change_item_processed_status(item["id"])
-            log(f"✅ アイテムID「{item['id']}」の「処理済」ステータスを更新しました。")
-            
-            log(f"✅ アイテムID {item['id']} の処理が完了しました。")
-            # Continue
-
-        log("すべてのアイテムの処理が完了しました。")
+        log(f"すべてのアイテムの処理が完了しました。（成功: {succeeded}件、失敗: {failed}件）")
     except Exception as e:
         log(e, level="error")
         return
+    finally:
+        stats = notion.stats()
+        log(f"Notion API: 送信 {stats.requests_sent}件、レート制限 {stats.throttled}件、"
+            f"再試行 {stats.retried}件、待機 {stats.wait_seconds:.1f}秒、現在のレート {stats.current_rate:.2f}件/秒")
+        cache_stats = download_cache.snapshot()
+        log(f"キャッシュ: ダウンロード ヒット {cache_stats.download_hits}件/ミス {cache_stats.download_misses}件、"
+            f"アップロード ヒット {cache_stats.upload_hits}件/ミス {cache_stats.upload_misses}件、"
+            f"削除 {cache_stats.evictions}件、節約 {cache_stats.bytes_saved / 1024 / 1024:.1f}MB")
+        disk_stats = disk_budget.snapshot()
+        if disk_stats.waits:
+            log(f"ディスク: 最大 {disk_stats.peak_reserved_bytes / 1024 / 1024:.1f}MB を確保、"
+                f"待機 {disk_stats.waits}回（{disk_stats.wait_seconds:.1f}秒）")
+        # 対象のアイテムがなかった実行ではレポートを出力しない
+        if has_work:
+            write_run_report()
+        metrics.close()
+        shutdown_media_pool()
 # End
 
 # ======== Main End ============================================================
 
-main()
-log("===== スクリプトが終了しました。\n\n")
-exit(0)
\ No newline at end of file
+if __name__ == "__main__":
+    main()
+    log("===== スクリプトが終了しました。\n\n")
+    exit(0)